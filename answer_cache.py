@@ -0,0 +1,148 @@
+"""
+Semantic Answer Cache
+
+This module caches generated answers so that a question which is
+semantically the same as one answered recently, against the same selection
+of documents, is answered without running retrieval and the chat model
+again. Questions are compared by the cosine similarity of their embeddings.
+
+Every index has a version number that is bumped whenever documents are
+ingested into it or deleted from it; cached answers record the versions of
+the indices they were built from and are ignored once any of them changes.
+"""
+
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional
+
+import numpy as np
+
+from config import get_logger
+
+logger = get_logger(__name__)
+
+# Cache settings
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+# Minimum cosine similarity between two questions for a cached answer to be reused
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.97"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+
+_index_versions: Dict[str, int] = {}
+_versions_lock = threading.Lock()
+
+
+def bump_index_version(index_name: str):
+    """Mark an index as changed, invalidating answers built from it."""
+    with _versions_lock:
+        _index_versions[index_name] = _index_versions.get(index_name, 0) + 1
+
+
+def get_index_versions(index_names) -> Dict[str, int]:
+    """Return the current version of each index."""
+    with _versions_lock:
+        return {name: _index_versions.get(name, 0) for name in index_names}
+
+
+class _Entry:
+    def __init__(self, vector: np.ndarray, answer: str, documents: List[dict], versions: Dict[str, int]):
+        self.vector = vector
+        self.answer = answer
+        self.documents = documents
+        self.versions = versions
+        self.created = time.time()
+
+
+class AnswerCache:
+    """LRU cache of answers, looked up by document selection and question similarity."""
+
+    def __init__(self, max_size: int = ANSWER_CACHE_SIZE, threshold: float = ANSWER_CACHE_THRESHOLD,
+                 ttl_seconds: float = ANSWER_CACHE_TTL_SECONDS):
+        self.max_size = max_size
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        # Entries are grouped by the set of selected doc_ids
+        self._entries: "OrderedDict[FrozenSet[str], List[_Entry]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(vector) -> np.ndarray:
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _is_valid(self, entry: _Entry, now: float) -> bool:
+        if now - entry.created > self.ttl_seconds:
+            return False
+        return get_index_versions(entry.versions) == entry.versions
+
+    def lookup(self, doc_ids: List[str], query_vector: List[float]) -> Optional[dict]:
+        """Return a cached {"answer", "documents", "similarity"} for a similar question, or None."""
+        key = frozenset(doc_ids)
+        vector = self._normalize(query_vector)
+        now = time.time()
+
+        with self._lock:
+            entries = self._entries.get(key)
+            if entries:
+                # Drop answers that have expired or whose indices have changed
+                valid = [entry for entry in entries if self._is_valid(entry, now)]
+                self._size -= len(entries) - len(valid)
+                if valid:
+                    self._entries[key] = valid
+                    self._entries.move_to_end(key)
+                    similarities = np.stack([entry.vector for entry in valid]) @ vector
+                    best = int(np.argmax(similarities))
+                    if similarities[best] >= self.threshold:
+                        self.hits += 1
+                        entry = valid[best]
+                        logger.info(f"Answer cache hit (similarity {similarities[best]:.3f})")
+                        return {"answer": entry.answer, "documents": entry.documents,
+                                "similarity": float(similarities[best])}
+                else:
+                    del self._entries[key]
+            self.misses += 1
+        return None
+
+    def store(self, doc_ids: List[str], query_vector: List[float], answer: str, documents: List[dict],
+              index_names):
+        """Cache an answer along with the current versions of the indices it was built from."""
+        entry = _Entry(self._normalize(query_vector), answer, documents, get_index_versions(index_names))
+        key = frozenset(doc_ids)
+        with self._lock:
+            self._entries.setdefault(key, []).append(entry)
+            self._entries.move_to_end(key)
+            self._size += 1
+            # Evict the least recently used document selections first
+            while self._size > self.max_size and self._entries:
+                oldest_key = next(iter(self._entries))
+                oldest = self._entries[oldest_key]
+                oldest.pop(0)
+                self._size -= 1
+                if not oldest:
+                    del self._entries[oldest_key]
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and the current size."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": self._size}
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+
+def get_answer_cache() -> Optional[AnswerCache]:
+    """Return the process-wide answer cache, or None if answer caching is disabled."""
+    global _answer_cache
+    if not ANSWER_CACHE_ENABLED:
+        return None
+    with _answer_cache_lock:
+        if _answer_cache is None:
+            _answer_cache = AnswerCache()
+    return _answer_cache
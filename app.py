@@ -22,15 +22,20 @@ from create_index_from_file import (
     create_index_definition, 
     create_index_from_file,
     create_docs_from_markdown,
-    index_client, 
-    search_service_endpoint,
-    search_api_key
+    ensure_index,
+    delete_document_chunks,
+    is_shared_index,
+    SHARED_INDEX_MODE,
+    SHARED_INDEX_NAME,
 )
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
+from clients import get_embeddings, get_index_client, release_search_client
 from config import get_logger
 from azure.search.documents.indexes.models import SearchIndex
 
+from answer_cache import get_answer_cache, bump_index_version
+from query_rewriter import rewrite_query
+from ask_pipeline import AskResult, NO_RESULTS_MESSAGE, iterate_sync, stream_answer
+
 # Import the improved PDF processor
 from pdf_processor import process_pdf, is_image_based_pdf
 
@@ -48,128 +53,21 @@ load_dotenv()
 # Constants
 DEFAULT_INDEX_PREFIX = "doc-index-"
 SUPPORTED_FILE_TYPES = [".pdf", ".docx", ".pptx", ".md", ".txt", ".csv"]
+# Show answers token by token as they are generated
+STREAM_ANSWERS = os.getenv("STREAM_ANSWERS", "true").lower() == "true"
 
-# We'll initialize search clients dynamically for each document index
-
-# Initialize embeddings
-from langchain_openai import AzureOpenAIEmbeddings
-embeddings = AzureOpenAIEmbeddings(
-    deployment="text-embedding-ada-002",
-    model="text-embedding-ada-002",
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_API_BASE"),
-    api_version=os.getenv("AZURE_OPENAI_API_VERSION")
-)
-
-# Initialize the chat model
-from langchain_openai import AzureChatOpenAI
-chat_model = AzureChatOpenAI(
-    deployment_name="gpt-4o",  # Ensure this matches your GPT-4 deployment
-    model="gpt-4o",
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_API_BASE"),
-    api_version=os.getenv("AZURE_OPENAI_API_VERSION")
-)
+# Search, embedding and chat clients are created lazily by the clients module
 
-# Define our own search function to replace get_product_documents
-def search_documents(question: str, doc_ids: List[str] = None, top_k: int = 5) -> List[dict]:
-    """Search for documents related to a question using Azure AI Search.
-    
-    This function now searches across multiple indices, one per document.
-    """
-    try:
-        # Validate inputs
-        if not question or question.strip() == "":
-            logger.warning("Empty question provided to search_documents")
-            return []
-            
-        # Make sure doc_ids is properly formatted if provided
-        if doc_ids is not None:
-            # Handle edge cases
-            if not isinstance(doc_ids, list):
-                logger.warning(f"doc_ids is not a list: {type(doc_ids)}. Converting to list.")
-                try:
-                    doc_ids = list(doc_ids)
-                except:
-                    logger.error(f"Could not convert doc_ids to list: {doc_ids}")
-                    doc_ids = []
-            
-            # Remove any None or empty values
-            doc_ids = [doc_id for doc_id in doc_ids if doc_id]
-            
-            # Check if we have any document IDs to search
-            if not doc_ids:
-                logger.warning("No valid document IDs provided for search")
-                return []
-        else:
-            logger.warning("No document IDs provided for search")
-            return []
-        
-        # Generate vector embeddings for the query
-        query_vector = embeddings.embed_query(question)
-        
-        # Use Azure AI Search vector search
-        from azure.search.documents.models import VectorizedQuery
-        vector_query = VectorizedQuery(vector=query_vector, k_nearest_neighbors=top_k, fields="contentVector")
-        
-        # Collect results from all selected document indices
-        all_documents = []
-        for doc_id in doc_ids:
-            # Get the index name for this document
-            if doc_id not in st.session_state.document_indices:
-                logger.warning(f"No index found for document ID {doc_id}")
-                continue
-                
-            index_name = st.session_state.document_indices[doc_id]
-            logger.info(f"Searching index {index_name} for document {doc_id}")
-            
-            # Create a search client for this index
-            search_client = SearchClient(
-                endpoint=search_service_endpoint,
-                index_name=index_name,
-                credential=AzureKeyCredential(search_api_key)
-            )
-            
-            try:
-                # Perform the search on this index
-                search_results = search_client.search(
-                    search_text=question,
-                    vector_queries=[vector_query],
-                    select=["id", "content", "filepath", "title", "url", "doc_id"]
-                )
-                
-                # Format the results for this document
-                documents = [
-                    {
-                        "id": result["id"],
-                        "content": result["content"],
-                        "filepath": result.get("filepath", "Unknown"),
-                        "title": result.get("title", "Untitled"),
-                        "url": result.get("url", ""),
-                        "doc_id": result.get("doc_id", ""),
-                        "index_name": index_name  # Add the index name for reference
-                    }
-                    for result in search_results
-                ]
-                
-                logger.info(f"Search found {len(documents)} matching chunks in index {index_name}")
-                all_documents.extend(documents)
-                
-            except Exception as e:
-                logger.error(f"Error searching index {index_name}: {e}")
-                # Continue with other indices even if one fails
-        
-        # Sort all results by relevance (we could implement a more sophisticated ranking here)
-        # For now, we just return all results, limited by top_k
-        top_results = all_documents[:top_k] if len(all_documents) > top_k else all_documents
-        
-        logger.info(f"Total search results across all indices: {len(top_results)}")
-        return top_results
-    except Exception as e:
-        logger.error(f"Search error: {e}")
-        import traceback
-        logger.error(f"Search error details: {traceback.format_exc()}")
-        return []
+def group_documents_by_index(doc_ids: List[str]) -> Dict[str, List[str]]:
+    """Group document IDs by the index holding them, skipping unknown documents."""
+    docs_by_index = {}
+    for doc_id in doc_ids:
+        # Get the index name for this document
+        if doc_id not in st.session_state.document_indices:
+            logger.warning(f"No index found for document ID {doc_id}")
+            continue
+        docs_by_index.setdefault(st.session_state.document_indices[doc_id], []).append(doc_id)
+    return docs_by_index
 
 def init_session_state():
     """Initialize session state variables."""
@@ -201,21 +99,25 @@ def init_session_state():
 def create_index_for_document(doc_id, file_name):
     """Create a new search index for a document.
     
-    Returns the index name.
+    In shared-index mode all documents use the same index instead.
+    
+    Returns:
+        (index_name, index_reused), where index_reused is True if an existing
+        index was reused; (None, None) if the index could not be created
     """
-    # Generate a unique index name based on document ID
-    # Ensure it follows Azure naming rules: lowercase letters, numbers, or dashes
-    index_name = f"{DEFAULT_INDEX_PREFIX}{doc_id.replace('-', '')}"
+    if SHARED_INDEX_MODE:
+        index_name = SHARED_INDEX_NAME
+    else:
+        # Generate a unique index name based on document ID
+        # Ensure it follows Azure naming rules: lowercase letters, numbers, or dashes
+        index_name = f"{DEFAULT_INDEX_PREFIX}{doc_id.replace('-', '')}"
     
     try:
-        # Check if the index already exists
-        try:
-            index_client.get_index(index_name)
+        # Create the index, or reuse it if it already exists with the current schema
+        index_reused = ensure_index(index_name, model=get_embeddings().model)
+        if index_reused:
             logger.info(f"Index '{index_name}' already exists")
-        except Exception:
-            # Create the index if it doesn't exist
-            index_definition = create_index_definition(index_name, model=embeddings.model)
-            index_client.create_index(index_definition)
+        else:
             logger.info(f"Created new index '{index_name}' for file '{file_name}'")
         
         # Store the mapping between doc_id and index_name
@@ -226,13 +128,13 @@ def create_index_for_document(doc_id, file_name):
         track_index(index_name, doc_id)
         logger.info(f"Tracking index '{index_name}' in session {st.session_state.get('session_id', 'unknown')}")
         
-        return index_name
+        return index_name, index_reused
         
     except Exception as e:
         logger.error(f"Error creating index for document: {e}")
         import traceback
         logger.error(traceback.format_exc())
-        return None
+        return None, None
 
 def process_file(file):
     """Process an uploaded file and prepare it for indexing."""
@@ -240,9 +142,16 @@ def process_file(file):
     markdown_path = None
     
     try:
-        # Generate a document ID
-        doc_id = str(uuid.uuid4())
-        logger.info(f"Processing file {file.name} with doc_id: {doc_id}")
+        # Reuse the document ID of a previously indexed file with the same name,
+        # so only its changed chunks are re-embedded and uploaded
+        existing_doc = next((doc for doc in st.session_state.indexed_documents if doc["name"] == file.name), None)
+        if existing_doc:
+            doc_id = existing_doc["id"]
+            logger.info(f"Re-indexing file {file.name} incrementally with doc_id: {doc_id}")
+        else:
+            # Generate a document ID
+            doc_id = str(uuid.uuid4())
+            logger.info(f"Processing file {file.name} with doc_id: {doc_id}")
         
         # Save the file temporarily
         temp_file_path = os.path.join(tempfile.gettempdir(), file.name)
@@ -307,7 +216,7 @@ def process_file(file):
             return None
         
         # Create a search index for this document
-        index_name = create_index_for_document(doc_id, file.name)
+        index_name, index_reused = create_index_for_document(doc_id, file.name)
         
         if index_name:
             # Index the document
@@ -317,7 +226,10 @@ def process_file(file):
                     index_name=index_name, 
                     file_path=markdown_path,
                     file_type=file_type,
-                    doc_id=doc_id
+                    doc_id=doc_id,
+                    incremental=existing_doc is not None,
+                    session_id=st.session_state.get("session_id"),
+                    index_reused=index_reused
                 )
                 
                 # Update session state with document info
@@ -334,7 +246,8 @@ def process_file(file):
                     st.session_state.indexed_documents.append(document_info)
                 
                 # Select the document by default
-                st.session_state.selected_doc_ids.append(doc_id)
+                if doc_id not in st.session_state.selected_doc_ids:
+                    st.session_state.selected_doc_ids.append(doc_id)
                 st.session_state[f"select_{doc_id}"] = True
                 
                 st.session_state.processing_status = f"{file.name} indexed successfully!"
@@ -367,74 +280,76 @@ def process_file(file):
         # Cleanup temp files if needed
         pass
 
+def record_answer(question, answer, docs, selected_doc_ids, query_vector):
+    """Store a generated answer in the conversation history and the answer cache."""
+    st.session_state.conversation_history.append({
+        "question": question,
+        "answer": answer,
+        "documents": docs
+    })
+    
+    # Count sources per document
+    doc_counts = {}
+    for doc in docs:
+        doc_id = doc.get("doc_id", "unknown")
+        doc_counts[doc_id] = doc_counts.get(doc_id, 0) + 1
+    logger.info(f"Generated answer from {len(docs)} document chunks across {len(doc_counts)} documents")
+    
+    answer_cache = get_answer_cache()
+    if answer_cache is not None:
+        index_names = {st.session_state.document_indices.get(doc_id) for doc_id in selected_doc_ids}
+        answer_cache.store(selected_doc_ids, query_vector, answer, docs, [name for name in index_names if name])
+
 def ask_question(question, selected_doc_ids=None):
     """Process a user question and get response from the indexed documents."""
+    return "".join(ask_question_stream(question, selected_doc_ids))
+
+def ask_question_stream(question, selected_doc_ids=None):
+    """Process a user question, yielding the answer as the model generates it.
+    
+    The answer is produced by the async ask pipeline, driven synchronously so
+    Streamlit can render it. The complete answer is recorded in the
+    conversation history once the stream finishes.
+    """
     # Use the documents from the selected document IDs
     if not question.strip():
-        return "Please enter a question."
-        
+        yield "Please enter a question."
+        return
+    
     try:
-        # Get relevant document chunks
-        docs = search_documents(question, selected_doc_ids)
-        
-        if not docs:
-            return "I couldn't find any relevant information to answer your question. Please try asking a different question or select different documents."
-        
-        # Count sources per document
-        doc_counts = {}
-        for doc in docs:
-            doc_id = doc.get("doc_id", "unknown")
-            if doc_id in doc_counts:
-                doc_counts[doc_id] += 1
-            else:
-                doc_counts[doc_id] = 1
-            
-        # Build simple context
-        context = "\n\n".join([f"Document: {doc.get('filepath', 'Unknown')}\nContent: {doc['content']}" for doc in docs])
-        
-        # Build the prompt
-        if len(docs) == 1:
-            # Single document
-            prompt = f"""You are an AI assistant helping to answer questions based on the provided document. 
-            Answer the following question using only the information from the document. If you don't know, say so.
-            
-            DOCUMENT CONTENT:
-            {context}
-            
-            QUESTION: {question}
-            
-            ANSWER:"""
-        else:
-            # Multiple documents
-            prompt = f"""You are an AI assistant helping to answer questions based on the provided documents.
-            Answer the following question using only the information from the documents. If you don't know, say so.
-            
-            DOCUMENT CONTENT:
-            {context}
-            
-            QUESTION: {question}
-            
-            ANSWER:"""
-        
-        # Get response from model
-        response = chat_model.invoke(prompt)
+        # Turn follow-up questions into standalone search queries using the conversation
+        search_question = rewrite_query(question, st.session_state.conversation_history)
+        
+        docs_by_index = group_documents_by_index([doc_id for doc_id in selected_doc_ids or [] if doc_id])
+        if not docs_by_index:
+            logger.warning("No valid document IDs provided for search")
+            yield NO_RESULTS_MESSAGE
+            return
+        
+        result = AskResult()
+        yield from iterate_sync(stream_answer(
+            question,
+            search_question,
+            docs_by_index,
+            selected_doc_ids,
+            session_id=st.session_state.get("session_id"),
+            result=result
+        ))
         
         # Store the conversation
-        st.session_state.conversation_history.append({
-            "question": question,
-            "answer": response.content,
-            "documents": docs
-        })
-        
-        logger.info(f"Generated answer from {len(docs)} document chunks across {len(doc_counts)} documents")
-        
-        # Return the answer
-        return response.content
+        if result.cached:
+            st.session_state.conversation_history.append({
+                "question": question,
+                "answer": result.answer,
+                "documents": result.documents
+            })
+        elif result.documents:
+            record_answer(question, result.answer, result.documents, selected_doc_ids, result.query_vector)
     except Exception as e:
         logger.error(f"Error asking question: {e}")
         import traceback
         logger.error(traceback.format_exc())
-        return f"An error occurred while generating an answer: {str(e)}"
+        yield f"An error occurred while generating an answer: {str(e)}"
 
 def display_document_info(docs):
     """Display information about documents used to answer a question."""
@@ -470,11 +385,19 @@ def display_document_info(docs):
                 st.divider()
 
 def delete_document_index(doc_id, index_name):
-    """Delete a document's index and remove it from the session state."""
+    """Delete a document's index and remove it from the session state.
+    
+    In a shared index only the document's chunks are deleted.
+    """
     try:
-        # Delete the index from Azure AI Search
+        # Delete the index (or the document's chunks) from Azure AI Search
         try:
-            index_client.delete_index(index_name)
+            if is_shared_index(index_name):
+                delete_document_chunks(index_name, doc_id)
+            else:
+                get_index_client().delete_index(index_name)
+                release_search_client(index_name)
+                bump_index_version(index_name)
             logger.info(f"Successfully deleted index {index_name} for document {doc_id}")
         except Exception as e:
             logger.error(f"Error deleting index {index_name}: {e}")
@@ -516,7 +439,7 @@ def main():
     init_session_state()
     
     # Register session for tracking and cleanup
-    register_session(index_client)
+    register_session(get_index_client())
     
     # Update session activity timestamp
     update_session_activity()
@@ -648,18 +571,24 @@ def main():
         # Button to ask question
         if st.button("Ask") and question:
             if selected_doc_ids:
-                with st.spinner("Thinking..."):
-                    # Pass selected document IDs to search function
-                    answer = ask_question(question, selected_doc_ids)
-                    
-                    # Display the answer
+                history_length = len(st.session_state.conversation_history)
+                if STREAM_ANSWERS:
+                    # Show the answer token by token as it is generated
                     st.subheader("Answer")
-                    st.write(answer)
-                    
-                    # Display document info if available
-                    if st.session_state.conversation_history:
-                        last_conversation = st.session_state.conversation_history[-1]
-                        display_document_info(last_conversation["documents"])
+                    st.write_stream(ask_question_stream(question, selected_doc_ids))
+                else:
+                    with st.spinner("Thinking..."):
+                        # Pass selected document IDs to search function
+                        answer = ask_question(question, selected_doc_ids)
+                        
+                        # Display the answer
+                        st.subheader("Answer")
+                        st.write(answer)
+                
+                # Display document info if this question was answered from the documents
+                if len(st.session_state.conversation_history) > history_length:
+                    last_conversation = st.session_state.conversation_history[-1]
+                    display_document_info(last_conversation["documents"])
             else:
                 st.warning("Please select at least one document to search.")
     else:
@@ -0,0 +1,237 @@
+"""
+Async Ask Pipeline
+
+This module answers a question with an asyncio pipeline that overlaps the
+stages which the sequential flow runs one after another:
+
+- the keyword leg of every index search starts immediately, while the
+  question embedding is being computed;
+- the vector leg of every index search starts as soon as the embedding is
+  ready, and all legs of all indices run concurrently;
+- the keyword and vector legs of each index are fused with reciprocal rank
+  fusion, the indices are merged into a global top-k by merge_results, the
+  content of the top results is loaded, and the chat model starts streaming
+  as soon as the context is packed.
+
+Blocking search calls run on the shared search thread pool and the question
+embedding on the model thread pool. The pipeline runs on one long-lived event
+loop in a background thread, and run_sync / iterate_sync let synchronous code
+such as the Streamlit app drive it.
+"""
+
+import asyncio
+import threading
+from typing import AsyncIterator, Dict, Iterator, List
+
+from answer_cache import get_answer_cache
+from clients import get_chat_model, get_embeddings, get_model_executor, get_search_executor
+from config import get_logger
+from context_packer import pack_context
+from embedding_cache import get_query_embedding_cache
+from ranking import fuse_legs, merge_results
+from retrieval import SEARCH_TIMEOUT_SECONDS, attach_content, fetch_chunks, group_ids_by_index, search_index
+
+logger = get_logger(__name__)
+
+NO_RESULTS_MESSAGE = ("I couldn't find any relevant information to answer your question. "
+                      "Please try asking a different question or select different documents.")
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Return the event loop the pipeline runs on, starting it on first use.
+
+    The loop is kept for the life of the process (rather than created per
+    question with asyncio.run) so that async HTTP clients held by the chat
+    model stay bound to a running loop.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="ask-pipeline", daemon=True).start()
+    return _loop
+
+
+def run_sync(coroutine):
+    """Run a coroutine on the pipeline loop and wait for its result."""
+    return asyncio.run_coroutine_threadsafe(coroutine, get_event_loop()).result()
+
+
+def iterate_sync(async_iterator: AsyncIterator) -> Iterator:
+    """Iterate an async iterator from synchronous code, one item at a time."""
+    loop = get_event_loop()
+    try:
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(async_iterator.__anext__(), loop).result()
+            except StopAsyncIteration:
+                return
+    finally:
+        asyncio.run_coroutine_threadsafe(async_iterator.aclose(), loop).result()
+
+
+def build_prompt(question: str, passages: List[dict]) -> str:
+    """Build the chat prompt from the packed context passages."""
+    context = "\n\n".join([f"Document: {passage['filepath']}\nContent: {passage['content']}" for passage in passages])
+
+    if len(passages) == 1:
+        # Single document
+        return f"""You are an AI assistant helping to answer questions based on the provided document.
+        Answer the following question using only the information from the document. If you don't know, say so.
+
+        DOCUMENT CONTENT:
+        {context}
+
+        QUESTION: {question}
+
+        ANSWER:"""
+
+    # Multiple documents
+    return f"""You are an AI assistant helping to answer questions based on the provided documents.
+        Answer the following question using only the information from the documents. If you don't know, say so.
+
+        DOCUMENT CONTENT:
+        {context}
+
+        QUESTION: {question}
+
+        ANSWER:"""
+
+
+class AskResult:
+    """Outcome of a pipeline run, filled in while the answer is streamed."""
+
+    def __init__(self):
+        self.answer = ""
+        self.documents: List[dict] = []
+        self.query_vector = None
+        # True when the answer came from the answer cache
+        self.cached = False
+
+
+def _run(loop, function, *args, executor=None):
+    return loop.run_in_executor(executor or get_search_executor(), function, *args)
+
+
+async def _collect(tasks: Dict[asyncio.Future, str], timeout: float, action: str) -> List[tuple]:
+    """Wait for tasks until the timeout and return (name, result) for those that succeeded."""
+    if not tasks:
+        return []
+    done, pending = await asyncio.wait(tasks, timeout=timeout)
+    for task in pending:
+        task.cancel()
+        logger.warning(f"{action} {tasks[task]} exceeded {timeout}s, returning partial results")
+
+    results = []
+    for task, name in tasks.items():
+        if task not in done:
+            continue
+        try:
+            results.append((name, task.result()))
+        except Exception as e:
+            logger.error(f"Error {action.lower()} {name}: {e}")
+    return results
+
+
+async def retrieve(search_question: str, docs_by_index: Dict[str, List[str]], session_id: str = None,
+                   top_k: int = 5, result: AskResult = None, doc_ids: List[str] = None) -> List[dict]:
+    """Search the selected indices and return the top_k chunks with their content.
+
+    If result and doc_ids are given, the answer cache is checked as soon as
+    the embedding is ready; on a hit, result is filled in and an empty list
+    is returned without waiting for the searches.
+    """
+    from azure.search.documents.models import VectorizedQuery
+
+    loop = asyncio.get_running_loop()
+    embedding = _run(loop, get_query_embedding_cache().embed_query, get_embeddings(), search_question,
+                     executor=get_model_executor())
+    keyword_searches = {
+        _run(loop, search_index, index_name, index_doc_ids, search_question, None, session_id, top_k): index_name
+        for index_name, index_doc_ids in docs_by_index.items()
+    }
+
+    try:
+        query_vector = await embedding
+    except BaseException:
+        for task in keyword_searches:
+            task.cancel()
+        raise
+
+    if result is not None:
+        result.query_vector = query_vector
+        answer_cache = get_answer_cache()
+        cached = answer_cache.lookup(doc_ids, query_vector) if answer_cache is not None and doc_ids else None
+        if cached is not None:
+            for task in keyword_searches:
+                task.cancel()
+            result.answer = cached["answer"]
+            result.documents = cached["documents"]
+            result.cached = True
+            return []
+
+    vector_query = VectorizedQuery(vector=query_vector, k_nearest_neighbors=top_k, fields="contentVector")
+    vector_searches = {
+        _run(loop, search_index, index_name, index_doc_ids, None, vector_query, session_id, top_k): index_name
+        for index_name, index_doc_ids in docs_by_index.items()
+    }
+
+    # Fuse the keyword and vector legs of each index, as hybrid search does within one
+    # index, then merge the indices (by normalised score or rank, see SEARCH_MERGE_METHOD)
+    searches = await _collect({**keyword_searches, **vector_searches}, SEARCH_TIMEOUT_SECONDS, "Search of index")
+    legs_by_index = {}
+    for index_name, results in searches:
+        legs_by_index.setdefault(index_name, []).append(results)
+    top_results = merge_results([fuse_legs(legs, top_k) for legs in legs_by_index.values()], top_k)
+
+    # Load the content of just the top results, one narrow query per index
+    fetches = {
+        _run(loop, fetch_chunks, index_name, chunk_ids): index_name
+        for index_name, chunk_ids in group_ids_by_index(top_results).items()
+    }
+    chunks = {}
+    for index_name, index_chunks in await _collect(fetches, SEARCH_TIMEOUT_SECONDS, "Loading content from index"):
+        for chunk_id, chunk in index_chunks.items():
+            chunks[(index_name, chunk_id)] = chunk
+    docs = attach_content(top_results, chunks)
+
+    logger.info(f"Total search results across all indices: {len(docs)}")
+    return docs
+
+
+async def stream_answer(question: str, search_question: str, docs_by_index: Dict[str, List[str]],
+                        doc_ids: List[str], session_id: str = None, result: AskResult = None,
+                        top_k: int = 5) -> AsyncIterator[str]:
+    """Answer a question, yielding the answer text as it is generated.
+
+    Args:
+        question: The question as asked by the user (used in the prompt)
+        search_question: The query used for retrieval (e.g. a rewritten question)
+        docs_by_index: Selected doc_ids grouped by the index holding them
+        doc_ids: All selected doc_ids (used as the answer cache key)
+        session_id: Session of the user, for shared-index filtering
+        result: Filled in with the complete answer, documents and query vector
+        top_k: Number of chunks to retrieve
+    """
+    result = result if result is not None else AskResult()
+    docs = await retrieve(search_question, docs_by_index, session_id, top_k, result=result, doc_ids=doc_ids)
+    if result.cached:
+        yield result.answer
+        return
+
+    if not docs:
+        result.answer = NO_RESULTS_MESSAGE
+        yield result.answer
+        return
+    result.documents = docs
+
+    prompt = build_prompt(question, pack_context(docs))
+    parts = []
+    async for chunk in get_chat_model().astream(prompt):
+        if chunk.content:
+            parts.append(chunk.content)
+            yield chunk.content
+    result.answer = "".join(parts)
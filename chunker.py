@@ -0,0 +1,175 @@
+"""
+Token-Aware Text Chunking
+
+This module splits text into chunks that target a token budget rather than a
+character count. Chunks are built from whole sentences and paragraphs, so words
+and sentences are not cut mid-way, and each chunk is returned with its token
+count so that embedding batching and prompt packing can use it without
+tokenizing the text again.
+
+Token counts come from tiktoken when it is installed; otherwise a character
+based estimate is used.
+"""
+
+import os
+import re
+from functools import lru_cache
+from typing import List, Tuple
+
+from config import get_logger
+from embedding_engine import estimate_tokens
+
+logger = get_logger(__name__)
+
+# Tokenizer used by the Azure OpenAI embedding and chat models
+TOKENIZER_ENCODING = os.getenv("TOKENIZER_ENCODING", "cl100k_base")
+# Default chunk budget (~1000 characters) and overlap (~200 characters)
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "250"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "50"))
+# Used to convert the character-based chunk sizes of older callers
+CHARS_PER_TOKEN = 4
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_SENTENCE_END = re.compile(r"((?<=[.!?;:])[ \t]+|[ \t]*\n\s*)")
+
+
+@lru_cache(maxsize=1)
+def get_encoder():
+    """Return the cached tiktoken encoder, or None if tiktoken is not installed."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding(TOKENIZER_ENCODING)
+    except Exception as e:
+        logger.warning(f"tiktoken unavailable ({e}), falling back to estimated token counts")
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Return the number of tokens in a piece of text."""
+    encoder = get_encoder()
+    if encoder is None:
+        return estimate_tokens(text)
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def _split_oversized(text: str, max_tokens: int) -> List[str]:
+    """Split a single sentence that is larger than the budget."""
+    encoder = get_encoder()
+    if encoder is not None:
+        tokens = encoder.encode(text, disallowed_special=())
+        return [encoder.decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+    # Without a tokenizer, split on words using the character estimate
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    words = []
+    for word in text.split():
+        words.extend(word[i:i + max_chars] for i in range(0, len(word), max_chars))
+
+    pieces = []
+    current = []
+    current_chars = 0
+    for word in words:
+        if current and current_chars + len(word) + 1 > max_chars:
+            pieces.append(" ".join(current))
+            current = []
+            current_chars = 0
+        current.append(word)
+        current_chars += len(word) + 1
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def _split_units(text: str, max_tokens: int) -> List[Tuple[str, int, str]]:
+    """Split text into sentence units of (text, tokens, separator)."""
+    units = []
+    for paragraph in _PARAGRAPH_BREAK.split(text):
+        # With a capturing group, split() alternates sentence, separator, sentence, ...
+        parts = _SENTENCE_END.split(paragraph)
+        sentences = []
+        for i in range(0, len(parts), 2):
+            sentence = parts[i].strip()
+            if sentence:
+                separator = "\n" if i + 1 < len(parts) and "\n" in parts[i + 1] else " "
+                sentences.append((sentence, separator))
+
+        for i, (sentence, separator) in enumerate(sentences):
+            if i == len(sentences) - 1:
+                separator = "\n\n"
+            tokens = count_tokens(sentence)
+            if tokens > max_tokens:
+                for piece in _split_oversized(sentence, max_tokens):
+                    units.append((piece, count_tokens(piece), " "))
+                units[-1] = (units[-1][0], units[-1][1], separator)
+            else:
+                units.append((sentence, tokens, separator))
+    return units
+
+
+def _join(units: List[Tuple[str, int, str]]) -> str:
+    return "".join(text + separator for text, _, separator in units).strip()
+
+
+def _fits(units: List[Tuple[str, int, str]], units_tokens: int, unit: Tuple[str, int, str], max_tokens: int) -> bool:
+    """Return True if unit can be added to units without the joined chunk exceeding max_tokens."""
+    total = units_tokens + unit[1]
+    if total > max_tokens:
+        return False
+    # With tiktoken the sum of the sentence counts is used as is. The character
+    # estimate rounds down per sentence and ignores separators, so the joined text
+    # can count up to about two tokens more per sentence; only near the budget is
+    # the joined text counted again
+    if get_encoder() is not None or total + 2 * (len(units) + 1) <= max_tokens:
+        return True
+    return count_tokens(_join(units + [unit])) <= max_tokens
+
+
+def chunk_text(text: str, max_tokens: int = None, overlap_tokens: int = None) -> List[Tuple[str, int]]:
+    """Split text into chunks that fit a token budget.
+
+    Args:
+        text: The text to split
+        max_tokens: Target maximum number of tokens per chunk
+        overlap_tokens: Number of tokens of trailing sentences repeated at the
+            start of the next chunk
+
+    Returns:
+        A list of (chunk text, token count) tuples
+    """
+    max_tokens = max_tokens or CHUNK_MAX_TOKENS
+    overlap_tokens = CHUNK_OVERLAP_TOKENS if overlap_tokens is None else overlap_tokens
+
+    if not text.strip():
+        return []
+
+    total_tokens = count_tokens(text)
+    if total_tokens <= max_tokens:
+        return [(text, total_tokens)]
+
+    chunks = []
+    current = []
+    current_tokens = 0
+    for unit in _split_units(text, max_tokens):
+        if current and not _fits(current, current_tokens, unit, max_tokens):
+            chunk = _join(current)
+            chunks.append((chunk, count_tokens(chunk)))
+
+            # Carry trailing sentences into the next chunk as overlap
+            overlap = []
+            overlap_total = 0
+            for previous in reversed(current):
+                if overlap_total + previous[1] > overlap_tokens:
+                    break
+                overlap.insert(0, previous)
+                overlap_total += previous[1]
+            if overlap and not _fits(overlap, overlap_total, unit, max_tokens):
+                overlap, overlap_total = [], 0
+            current, current_tokens = overlap, overlap_total
+
+        current.append(unit)
+        current_tokens += unit[1]
+
+    if current:
+        chunk = _join(current)
+        chunks.append((chunk, count_tokens(chunk)))
+    return chunks
@@ -0,0 +1,256 @@
+"""
+Azure Client Factory
+
+This module constructs the Azure OpenAI and Azure AI Search clients lazily, on
+first use, instead of at import time. Importing the app (or a test script)
+therefore costs no network round-trips; connectivity is verified explicitly
+with health_check().
+
+Search, index and Document Intelligence clients are cached per process and
+share a single HTTP transport, so connections (and their TLS sessions) are
+kept alive and reused across questions and uploads.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict
+
+from azure.core.credentials import AzureKeyCredential
+from config import get_logger
+from embedding_engine import EMBEDDING_DIMENSIONS
+
+logger = get_logger(__name__)
+
+# Azure OpenAI deployments
+EMBEDDING_DEPLOYMENT = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT", "text-embedding-ada-002")
+CHAT_DEPLOYMENT = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT", "gpt-4o")
+# Small, fast deployment used to rewrite follow-up questions into search queries
+REWRITE_DEPLOYMENT = os.getenv("AZURE_OPENAI_REWRITE_DEPLOYMENT", "gpt-4o-mini")
+
+# Azure AI Search configuration
+search_service_endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
+search_api_key = os.getenv("AZURE_SEARCH_API_KEY")
+# Number of indices a question is expected to search at most (documents selected
+# in per-document index mode); used to size the search thread pool
+SEARCH_MAX_INDICES = int(os.getenv("SEARCH_MAX_INDICES", "10"))
+# Each index needs a keyword and a vector query and then a content fetch, and
+# queries that exceed the deadline keep their thread until they return, so the
+# default leaves room for all three per index
+SEARCH_MAX_WORKERS = int(os.getenv("SEARCH_MAX_WORKERS") or 3 * SEARCH_MAX_INDICES)
+# Threads for the question embedding and query rewrites, kept apart from the searches
+MODEL_MAX_WORKERS = int(os.getenv("MODEL_MAX_WORKERS", "4"))
+# Keep-alive connections held per host by the shared HTTP transport
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))
+# Maximum number of per-index search clients kept
+SEARCH_CLIENT_CACHE_SIZE = int(os.getenv("SEARCH_CLIENT_CACHE_SIZE", "64"))
+
+_dimensions = None
+_dimensions_lock = threading.Lock()
+_search_clients = OrderedDict()
+_search_clients_lock = threading.Lock()
+
+
+@lru_cache(maxsize=None)
+def get_embeddings():
+    """Return the shared AzureOpenAIEmbeddings instance."""
+    from langchain_openai import AzureOpenAIEmbeddings
+
+    embeddings = AzureOpenAIEmbeddings(
+        deployment=EMBEDDING_DEPLOYMENT,
+        model=EMBEDDING_DEPLOYMENT,
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        azure_endpoint=os.getenv("AZURE_OPENAI_API_BASE"),
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION")
+    )
+    logger.info(f"Initialized AzureOpenAIEmbeddings for deployment '{EMBEDDING_DEPLOYMENT}'")
+    return embeddings
+
+
+@lru_cache(maxsize=None)
+def get_chat_model():
+    """Return the shared AzureChatOpenAI instance."""
+    from langchain_openai import AzureChatOpenAI
+
+    chat_model = AzureChatOpenAI(
+        deployment_name=CHAT_DEPLOYMENT,
+        model=CHAT_DEPLOYMENT,
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        azure_endpoint=os.getenv("AZURE_OPENAI_API_BASE"),
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION")
+    )
+    logger.info(f"Initialized AzureChatOpenAI for deployment '{CHAT_DEPLOYMENT}'")
+    return chat_model
+
+
+@lru_cache(maxsize=None)
+def get_rewrite_model():
+    """Return the shared AzureChatOpenAI instance used for query rewriting.
+
+    Rewrites have a strict latency budget, so requests are not retried.
+    """
+    from langchain_openai import AzureChatOpenAI
+
+    rewrite_model = AzureChatOpenAI(
+        deployment_name=REWRITE_DEPLOYMENT,
+        model=REWRITE_DEPLOYMENT,
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        azure_endpoint=os.getenv("AZURE_OPENAI_API_BASE"),
+        api_version=os.getenv("AZURE_OPENAI_API_VERSION"),
+        temperature=0,
+        max_tokens=100,
+        max_retries=0
+    )
+    logger.info(f"Initialized AzureChatOpenAI for deployment '{REWRITE_DEPLOYMENT}'")
+    return rewrite_model
+
+
+@lru_cache(maxsize=None)
+def get_http_transport():
+    """Return the HTTP transport shared by all Azure SDK clients.
+
+    A single requests session with a sized connection pool keeps connections
+    alive between calls instead of each client opening its own.
+    """
+    import requests
+    from requests.adapters import HTTPAdapter
+    from azure.core.pipeline.transport import RequestsTransport
+
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=HTTP_POOL_MAXSIZE, pool_maxsize=HTTP_POOL_MAXSIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    # session_owner=False stops a client from closing the session shared with the others
+    return RequestsTransport(session=session, session_owner=False)
+
+
+@lru_cache(maxsize=None)
+def get_index_client():
+    """Return the shared SearchIndexClient."""
+    from azure.search.documents.indexes import SearchIndexClient
+
+    return SearchIndexClient(endpoint=search_service_endpoint,
+                             credential=AzureKeyCredential(search_api_key),
+                             transport=get_http_transport())
+
+
+def get_search_client(index_name: str):
+    """Return the cached SearchClient for the given index.
+
+    In per-document index mode every upload uses a new index, so the cache
+    keeps only the SEARCH_CLIENT_CACHE_SIZE most recently used clients.
+    """
+    from azure.search.documents import SearchClient
+
+    with _search_clients_lock:
+        search_client = _search_clients.get(index_name)
+        if search_client is not None:
+            _search_clients.move_to_end(index_name)
+            return search_client
+
+        search_client = SearchClient(
+            endpoint=search_service_endpoint,
+            index_name=index_name,
+            credential=AzureKeyCredential(search_api_key),
+            transport=get_http_transport()
+        )
+        _search_clients[index_name] = search_client
+        while len(_search_clients) > SEARCH_CLIENT_CACHE_SIZE:
+            _search_clients.popitem(last=False)
+        return search_client
+
+
+def release_search_client(index_name: str):
+    """Drop the cached SearchClient of an index, e.g. after the index is deleted."""
+    with _search_clients_lock:
+        _search_clients.pop(index_name, None)
+
+
+@lru_cache(maxsize=None)
+def get_document_intelligence_client(endpoint: str, key: str):
+    """Return the cached DocumentIntelligenceClient for an endpoint and key."""
+    from azure.ai.documentintelligence import DocumentIntelligenceClient
+
+    return DocumentIntelligenceClient(
+        endpoint=endpoint,
+        credential=AzureKeyCredential(key),
+        transport=get_http_transport()
+    )
+
+
+@lru_cache(maxsize=None)
+def get_search_executor() -> ThreadPoolExecutor:
+    """Return the thread pool used to query several indices concurrently.
+
+    It lives here rather than in app.py because Streamlit re-executes the app
+    script on every interaction.
+    """
+    return ThreadPoolExecutor(max_workers=SEARCH_MAX_WORKERS, thread_name_prefix="search")
+
+
+@lru_cache(maxsize=None)
+def get_model_executor() -> ThreadPoolExecutor:
+    """Return the thread pool for blocking model calls made while answering a question.
+
+    The question embedding and query rewrites run here so they never wait
+    behind index queries in the search pool.
+    """
+    return ThreadPoolExecutor(max_workers=MODEL_MAX_WORKERS, thread_name_prefix="model")
+
+
+def get_vector_dimensions() -> int:
+    """Return the vector dimensions of the embedding deployment.
+
+    Known models are resolved from EMBEDDING_DIMENSIONS without a network call;
+    anything else is discovered once by embedding a short probe string. The
+    result is cached for the life of the process.
+    """
+    global _dimensions
+    with _dimensions_lock:
+        if _dimensions is None:
+            embeddings = get_embeddings()
+            dimensions = getattr(embeddings, "dimensions", None) or EMBEDDING_DIMENSIONS.get(embeddings.model)
+            if dimensions is None:
+                dimensions = len(embeddings.embed_query("dimension probe"))
+                logger.info(f"Discovered vector dimension {dimensions} for model '{embeddings.model}'")
+            _dimensions = dimensions
+    return _dimensions
+
+
+def health_check() -> Dict[str, str]:
+    """Check connectivity to Azure OpenAI and Azure AI Search.
+
+    Returns:
+        A dict mapping each service to "ok" or the error message
+    """
+    global _dimensions
+    status = {}
+
+    try:
+        vector = get_embeddings().embed_query("health check")
+        with _dimensions_lock:
+            _dimensions = len(vector)
+        status["embeddings"] = "ok"
+    except Exception as e:
+        status["embeddings"] = str(e)
+
+    try:
+        next(iter(get_index_client().list_index_names()), None)
+        status["search"] = "ok"
+    except Exception as e:
+        status["search"] = str(e)
+
+    for service, result in status.items():
+        if result == "ok":
+            logger.info(f"Health check passed for {service}")
+        else:
+            logger.error(f"Health check failed for {service}: {result}")
+    return status
+
+
+if __name__ == "__main__":
+    results = health_check()
+    for service, result in results.items():
+        print(f"{service}: {result}")
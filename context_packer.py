@@ -0,0 +1,134 @@
+"""
+Prompt Context Packing
+
+This module turns the retrieved chunks for a question into the context passed
+to the chat model. Chunks are indexed with an overlap, so neighbouring chunks
+of the same page (or slide/section) repeat text; retrieved neighbours are
+merged into one passage with the repeated span removed. Passages are then
+added in relevance order until a token budget is filled, which keeps the
+prompt size bounded however many chunks are retrieved.
+"""
+
+import os
+import re
+from typing import Dict, List, Tuple
+
+from config import get_logger
+from chunker import chunk_text, count_tokens
+
+logger = get_logger(__name__)
+
+# Maximum number of tokens of document content included in a prompt
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "3000"))
+# Shortest repeated span treated as chunk overlap, to avoid matching common words
+MIN_OVERLAP_CHARS = 20
+
+# Chunk ids look like "<doc_id>_page3_chunk2"; chunks sharing everything before
+# "_chunk" come from the same page, slide or section
+_CHUNK_ID = re.compile(r"^(?P<group>.+)_chunk(?P<number>\d+)$")
+
+
+def strip_overlap(previous: str, text: str) -> str:
+    """Remove the start of text that repeats the end of previous."""
+    probe = text[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return text
+
+    # Check every place the start of text occurs in previous, longest overlap first
+    position = previous.find(probe)
+    while position != -1:
+        overlap = len(previous) - position
+        if text.startswith(previous[position:]):
+            return text[overlap:].lstrip()
+        position = previous.find(probe, position + 1)
+    return text
+
+
+def _chunk_position(doc: dict) -> Tuple[tuple, int]:
+    """Return the (group, chunk number) of a chunk, or a unique group if the id has no chunk number."""
+    match = _CHUNK_ID.match(str(doc.get("id", "")))
+    if not match:
+        return (doc.get("index_name"), doc.get("id")), 0
+    return (doc.get("index_name"), match.group("group")), int(match.group("number"))
+
+
+def merge_adjacent_chunks(docs: List[dict]) -> List[dict]:
+    """Merge retrieved chunks that are consecutive within the same page, slide or section.
+
+    Args:
+        docs: Retrieved chunks, most relevant first
+
+    Returns:
+        Passages ordered by the rank of their most relevant chunk, each with
+        "content", "doc_id", "filepath", "title", "chunk_ids" and "rank"
+    """
+    groups: Dict[tuple, List[Tuple[int, int, dict]]] = {}
+    for rank, doc in enumerate(docs):
+        group, number = _chunk_position(doc)
+        groups.setdefault(group, []).append((number, rank, doc))
+
+    passages = []
+    for members in groups.values():
+        members.sort(key=lambda member: member[0])
+        run = []
+        for member in members:
+            # The same chunk can be returned twice (e.g. from two queries); keep one copy
+            if run and member[0] == run[-1][0]:
+                continue
+            if run and member[0] != run[-1][0] + 1:
+                passages.append(_merge_run(run))
+                run = []
+            run.append(member)
+        passages.append(_merge_run(run))
+
+    passages.sort(key=lambda passage: passage["rank"])
+    return passages
+
+
+def _merge_run(run: List[Tuple[int, int, dict]]) -> dict:
+    first = run[0][2]
+    content = first["content"]
+    for _, _, doc in run[1:]:
+        content = f"{content}\n{strip_overlap(content, doc['content'])}"
+    return {
+        "content": content,
+        "doc_id": first.get("doc_id"),
+        "filepath": first.get("filepath", "Unknown"),
+        "title": first.get("title"),
+        "chunk_ids": [doc["id"] for _, _, doc in run],
+        "rank": min(rank for _, rank, _ in run),
+        # A single chunk already carries its token count from indexing
+        "token_count": first.get("token_count") if len(run) == 1 else None,
+    }
+
+
+def pack_context(docs: List[dict], max_tokens: int = None) -> List[dict]:
+    """Build the prompt passages for a question from its retrieved chunks.
+
+    Adjacent chunks are merged with their overlap removed, then passages are
+    taken in relevance order while they fit in max_tokens. If even the most
+    relevant passage does not fit, it is truncated to the budget.
+
+    Args:
+        docs: Retrieved chunks, most relevant first
+        max_tokens: Token budget for the passages (defaults to CONTEXT_MAX_TOKENS)
+
+    Returns:
+        The selected passages, most relevant first, each with a "token_count"
+    """
+    max_tokens = max_tokens or CONTEXT_MAX_TOKENS
+
+    packed = []
+    used = 0
+    for passage in merge_adjacent_chunks(docs):
+        tokens = passage["token_count"] or count_tokens(passage["content"])
+        if not packed and tokens > max_tokens:
+            # Never drop the most relevant passage; keep as much of it as fits
+            passage["content"], tokens = chunk_text(passage["content"], max_tokens=max_tokens, overlap_tokens=0)[0]
+        passage["token_count"] = tokens
+        if used + tokens <= max_tokens:
+            packed.append(passage)
+            used += tokens
+
+    logger.info(f"Packed {len(docs)} chunks into {len(packed)} passages ({used} tokens)")
+    return packed
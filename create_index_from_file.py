@@ -1,13 +1,24 @@
 import os
+import json
 import uuid
-from azure.identity import DefaultAzureCredential
-from azure.core.credentials import AzureKeyCredential
-from azure.search.documents import SearchClient
-from azure.search.documents.indexes import SearchIndexClient
-from langchain_openai import AzureOpenAIEmbeddings
+import hashlib
+from azure.core.exceptions import HttpResponseError, ResourceNotFoundError
 from config import get_logger
+from clients import (
+    get_embeddings,
+    get_index_client,
+    get_search_client,
+    get_vector_dimensions,
+)
+from embedding_engine import embed_texts, EMBEDDING_DIMENSIONS
+from embedding_cache import get_embedding_cache, text_hash
+from ingestion_pipeline import run_ingestion
+from chunker import chunk_text, count_tokens, CHARS_PER_TOKEN
+from search_uploader import SearchUploader
+from answer_cache import bump_index_version
 import tempfile
 from pathlib import Path
+from typing import Iterator
 
 # Import Office document libraries
 try:
@@ -23,29 +34,12 @@ except ImportError:
 # initialize logging object
 logger = get_logger(__name__)
 
-# Initialize embeddings
-try:
-    embeddings = AzureOpenAIEmbeddings(
-        deployment="text-embedding-ada-002",
-        model="text-embedding-ada-002",
-        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-        azure_endpoint=os.getenv("AZURE_OPENAI_API_BASE"),
-        api_version=os.getenv("AZURE_OPENAI_API_VERSION")
-    )
-    # Test that embed_query method exists and works
-    test_embedding = embeddings.embed_query("test")
-    logger.info(f"AzureOpenAIEmbeddings initialized successfully. Vector dimension: {len(test_embedding)}")
-except Exception as e:
-    logger.error(f"Error initializing embeddings: {e}")
-    raise
+# Embeddings, index and search clients are created lazily by the clients module,
+# so importing this module does not touch the network.
 
-# Azure Cognitive Search configuration
-search_service_endpoint = os.getenv("AZURE_SEARCH_ENDPOINT")
-search_api_key = os.getenv("AZURE_SEARCH_API_KEY")
-
-# Initialize SearchIndexClient
-index_client = SearchIndexClient(endpoint=search_service_endpoint, 
-                               credential=AzureKeyCredential(search_api_key))
+# Shared-index mode stores every document in one index, isolated by doc_id and session_id
+SHARED_INDEX_MODE = os.getenv("SHARED_INDEX_MODE", "false").lower() == "true"
+SHARED_INDEX_NAME = os.getenv("SHARED_INDEX_NAME", "doc-index-shared")
 
 import pandas as pd
 from azure.search.documents.indexes.models import (
@@ -68,18 +62,25 @@ from azure.search.documents.indexes.models import (
     SearchIndex,
 )
 
-def create_index_definition(index_name: str, model: str) -> SearchIndex:
-    dimensions = 1536  # text-embedding-ada-002
-    if model == "text-embedding-3-large":
-        dimensions = 3072    # The fields we want to index. The "embedding" field is a vector field that will
+def create_index_definition(index_name: str, model: str, dimensions: int = None) -> SearchIndex:
+    if dimensions is None:
+        dimensions = EMBEDDING_DIMENSIONS.get(model, 1536)  # 1536 for text-embedding-ada-002
+    # The fields we want to index. The "embedding" field is a vector field that will
     # be used for vector search.
     fields = [
-        SimpleField(name="id", type=SearchFieldDataType.String, key=True),
+        # Filterable so retrieval can fetch the content of selected chunks by id
+        SimpleField(name="id", type=SearchFieldDataType.String, key=True, filterable=True),
         SearchableField(name="content", type=SearchFieldDataType.String),
         SimpleField(name="filepath", type=SearchFieldDataType.String),
         SearchableField(name="title", type=SearchFieldDataType.String),
         SimpleField(name="url", type=SearchFieldDataType.String),
         SimpleField(name="doc_id", type=SearchFieldDataType.String, filterable=True),
+        # Session that uploaded the document, for isolation in the shared index
+        SimpleField(name="session_id", type=SearchFieldDataType.String, filterable=True),
+        # Hash of the chunk content, used to skip unchanged chunks when re-indexing
+        SimpleField(name="content_hash", type=SearchFieldDataType.String),
+        # Token count of the chunk, used for prompt packing without re-tokenizing
+        SimpleField(name="token_count", type=SearchFieldDataType.Int32),
         SearchField(
             name="contentVector",
             type=SearchFieldDataType.Collection(SearchFieldDataType.Single),
@@ -144,9 +145,128 @@ def create_index_definition(index_name: str, model: str) -> SearchIndex:
         vector_search=vector_search,
     )
 
-# define a function for indexing a markdown file, that chunks the content
-# and generates vector embeddings for each chunk
-def create_docs_from_markdown(path: str, model: str, chunk_size: int = 1000, chunk_overlap: int = 200, doc_id: str = None) -> list[dict[str, any]]:
+def _enum_value(value):
+    """Return the plain string value of an SDK enum (or the value itself)."""
+    return getattr(value, "value", value)
+
+def index_fingerprint(index: SearchIndex) -> str:
+    """
+    Compute a fingerprint of the parts of an index definition that affect ingestion.
+    
+    The fingerprint covers fields, vector dimensions, vector algorithm parameters
+    and the semantic configuration. It is computed the same way for a local
+    definition and for an index fetched from the service, so an existing index
+    can be compared against create_index_definition without storing anything extra.
+    """
+    fields = sorted(
+        (
+            field.name,
+            _enum_value(field.type),
+            bool(field.key),
+            bool(field.searchable),
+            bool(field.filterable),
+            getattr(field, "vector_search_dimensions", None),
+            getattr(field, "vector_search_profile_name", None),
+        )
+        for field in index.fields
+    )
+
+    algorithms = []
+    profiles = []
+    if index.vector_search:
+        for algorithm in index.vector_search.algorithms or []:
+            parameters = getattr(algorithm, "parameters", None)
+            algorithms.append((
+                algorithm.name,
+                _enum_value(algorithm.kind),
+                getattr(parameters, "m", None),
+                getattr(parameters, "ef_construction", None),
+                getattr(parameters, "ef_search", None),
+                _enum_value(getattr(parameters, "metric", None)),
+            ))
+        profiles = [(profile.name, profile.algorithm_configuration_name)
+                    for profile in index.vector_search.profiles or []]
+
+    semantic = []
+    if index.semantic_search:
+        for config in index.semantic_search.configurations or []:
+            prioritized = config.prioritized_fields
+            semantic.append((
+                config.name,
+                prioritized.title_field.field_name if prioritized.title_field else None,
+                [field.field_name for field in prioritized.content_fields or []],
+                [field.field_name for field in prioritized.keywords_fields or []],
+            ))
+
+    canonical = json.dumps(
+        {"fields": fields, "algorithms": sorted(algorithms), "profiles": sorted(profiles), "semantic": sorted(semantic)},
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+def ensure_index(index_name: str, model: str) -> bool:
+    """
+    Make sure an index with the current schema exists.
+    
+    An existing index whose fingerprint matches create_index_definition is reused;
+    otherwise it is deleted and recreated. The shared index is never deleted,
+    since it holds the documents of every session (see update_shared_index).
+    
+    Returns:
+        True if an existing index was reused, False if a new index was created
+    """
+    index_client = get_index_client()
+    index_definition = create_index_definition(index_name, model=model, dimensions=get_vector_dimensions())
+    expected_fingerprint = index_fingerprint(index_definition)
+
+    try:
+        existing_index = index_client.get_index(index_name)
+    except ResourceNotFoundError:
+        existing_index = None
+
+    if existing_index is not None:
+        if index_fingerprint(existing_index) == expected_fingerprint:
+            logger.info(f"Reusing index '{index_name}' (schema fingerprint {expected_fingerprint})")
+            return True
+        if is_shared_index(index_name):
+            return update_shared_index(index_name, index_definition)
+        index_client.delete_index(index_name)
+        logger.info(f"🗑️  Schema of index '{index_name}' changed, deleted it")
+
+    index_client.create_index(index_definition)
+    logger.info(f"Created index '{index_name}' (schema fingerprint {expected_fingerprint})")
+    return False
+
+def update_shared_index(index_name: str, index_definition: SearchIndex) -> bool:
+    """
+    Bring the shared index up to the current schema in place.
+    
+    New fields can be added to an existing index; other changes (such as new
+    vector dimensions, or making an existing field filterable) are rejected by
+    the service and need an explicit migration, since deleting the index would
+    silently remove the documents of every session.
+    
+    Returns:
+        True, as the existing index (and its documents) is kept
+    """
+    try:
+        get_index_client().create_or_update_index(index_definition)
+    except HttpResponseError as e:
+        raise ValueError(
+            f"The schema of shared index '{index_name}' changed in a way that cannot be applied in place "
+            f"({e.message}). Migrate it explicitly: re-index its documents into a new index and point "
+            f"SHARED_INDEX_NAME at it, or delete '{index_name}' if its documents can be discarded."
+        ) from e
+    logger.info(f"Updated schema of shared index '{index_name}' (fingerprint {index_fingerprint(index_definition)})")
+    return True
+
+# define a generator that reads a markdown file and yields one record per chunk,
+# without vector embeddings
+def iter_chunks_from_markdown(path: str, chunk_size: int = 1000, chunk_overlap: int = 200, doc_id: str = None) -> Iterator[dict[str, any]]:
+    # chunk_size and chunk_overlap are given in characters and converted to token budgets
+    max_tokens = max(1, int(chunk_size) // CHARS_PER_TOKEN)
+    overlap_tokens = int(chunk_overlap) // CHARS_PER_TOKEN
     # Generate a document ID if not provided
     if doc_id is None:
         doc_id = str(uuid.uuid4())
@@ -231,7 +351,6 @@ def create_docs_from_markdown(path: str, model: str, chunk_size: int = 1000, chu
         is_slide_content = False
         content_type = "sections"
     
-    items = []
     for i, page_content in enumerate(pages):
         # Skip empty pages/slides
         if not page_content.strip():
@@ -261,17 +380,13 @@ def create_docs_from_markdown(path: str, model: str, chunk_size: int = 1000, chu
                 page_num = str(i)
                 content = page_content
         
-        # Further chunk the content if it's too large
-        chunks = []
-        if len(content) > chunk_size:
-            # Simple chunking by splitting into smaller pieces with overlap
-            for j in range(0, len(content), chunk_size - chunk_overlap):
-                chunk = content[j:j + chunk_size]
-                if chunk.strip():  # Skip empty chunks
-                    chunks.append(chunk)
-        else:
-            chunks = [content]
-          # Create a document for each chunk
+        # Further chunk the content on sentence/paragraph boundaries if it's over the token budget
+        chunks = chunk_text(content, max_tokens=max_tokens, overlap_tokens=overlap_tokens)
+        if not chunks:
+            continue
+        token_counts = [tokens for _, tokens in chunks]
+        chunks = [chunk for chunk, _ in chunks]
+        # Create a document for each chunk
         for j, chunk in enumerate(chunks):
             try:
                 # Generate a unique ID for each chunk
@@ -332,8 +447,7 @@ def create_docs_from_markdown(path: str, model: str, chunk_size: int = 1000, chu
                     # Set the URL to point to the specific section
                     url = f"/document/section-{section_num}"
                 
-                # Generate embeddings for the chunk using embed_query
-                embedding_vector = embeddings.embed_query(chunk)                # Create and add the record with document ID
+                # Create the record with document ID; vectors are added by the caller
                 rec = {
                     "id": chunk_id,
                     "content": chunk,
@@ -341,19 +455,34 @@ def create_docs_from_markdown(path: str, model: str, chunk_size: int = 1000, chu
                     "title": title,
                     "url": url,
                     "doc_id": doc_id,
-                    "contentVector": embedding_vector,
+                    "token_count": token_counts[j],
                 }
-                items.append(rec)
             except Exception as e:
-                logger.error(f"Error generating embeddings for chunk: {e}")
+                logger.error(f"Error creating record for chunk: {e}")
                 raise
+            yield rec
+
+# define a function for indexing a markdown file, that chunks the content
+# and generates vector embeddings for each chunk
+def create_docs_from_markdown(path: str, model: str, chunk_size: int = 1000, chunk_overlap: int = 200, doc_id: str = None) -> list[dict[str, any]]:
+    items = list(iter_chunks_from_markdown(path, chunk_size=chunk_size, chunk_overlap=chunk_overlap, doc_id=doc_id))
+    
+    # Generate embeddings for all chunks using batched embed_documents requests
+    try:
+        vectors = embed_texts(get_embeddings(), [rec["content"] for rec in items], cache=get_embedding_cache(),
+                              token_counts=[rec["token_count"] for rec in items])
+        for rec, vector in zip(items, vectors):
+            rec["contentVector"] = vector
+    except Exception as e:
+        logger.error(f"Error generating embeddings for chunks: {e}")
+        raise
     
     logger.info(f"Created {len(items)} document chunks from markdown file")
     return items
 
-# define a function for indexing a csv file, that adds each row as a document
-# and generates vector embeddings for the specified content_column
-def create_docs_from_csv(path: str, content_column: str, model: str) -> list[dict[str, any]]:
+# define a generator that reads a csv file and yields one record per row,
+# without vector embeddings
+def iter_rows_from_csv(path: str, content_column: str) -> Iterator[dict[str, any]]:
     try:
         products = pd.read_csv(path)
         logger.info(f"Successfully read CSV file: {path}")
@@ -361,7 +490,6 @@ def create_docs_from_csv(path: str, content_column: str, model: str) -> list[dic
         logger.error(f"Error reading CSV file: {e}")
         raise
         
-    items = []
     for product in products.to_dict("records"):
         try:
             content = product[content_column]
@@ -369,26 +497,56 @@ def create_docs_from_csv(path: str, content_column: str, model: str) -> list[dic
             title = product["name"]
             url = f"/products/{title.lower().replace(' ', '-')}"
             
-            # Generate embeddings for the content using embed_query
-            embedding_vector = embeddings.embed_query(content)
-            
             rec = {
                 "id": id,
                 "content": content,
                 "filepath": f"{title.lower().replace(' ', '-')}",
                 "title": title,
                 "url": url,
-                "contentVector": embedding_vector,
             }
-            items.append(rec)
         except Exception as e:
             logger.error(f"Error processing CSV row: {e}")
             raise
+        yield rec
+
+# define a function for indexing a csv file, that adds each row as a document
+# and generates vector embeddings for the specified content_column
+def create_docs_from_csv(path: str, content_column: str, model: str) -> list[dict[str, any]]:
+    items = list(iter_rows_from_csv(path, content_column))
+
+    # Generate embeddings for all rows using batched embed_documents requests
+    try:
+        vectors = embed_texts(get_embeddings(), [rec["content"] for rec in items], cache=get_embedding_cache())
+        for rec, vector in zip(items, vectors):
+            rec["contentVector"] = vector
+    except Exception as e:
+        logger.error(f"Error generating embeddings for CSV rows: {e}")
+        raise
 
     logger.info(f"Created {len(items)} documents from CSV file")
     return items
 
-def create_index_from_file(index_name, file_path, file_type='markdown', doc_id=None):
+def is_shared_index(index_name: str) -> bool:
+    """Return True if the index holds the chunks of many documents."""
+    return index_name == SHARED_INDEX_NAME
+
+def delete_document_chunks(index_name: str, doc_id: str) -> int:
+    """
+    Delete every chunk of a document from an index, leaving the index in place.
+    
+    Returns:
+        The number of chunks deleted
+    """
+    search_client = get_search_client(index_name)
+    chunk_ids = list(get_indexed_hashes(search_client, doc_id))
+    if chunk_ids:
+        SearchUploader(search_client, action="delete").upload_all([{"id": chunk_id} for chunk_id in chunk_ids])
+        bump_index_version(index_name)
+    logger.info(f"Deleted {len(chunk_ids)} chunks of document {doc_id} from '{index_name}'")
+    return len(chunk_ids)
+
+def create_index_from_file(index_name, file_path, file_type='markdown', doc_id=None, incremental=False,
+                           session_id=None, index_reused=None):
     """
     Create an Azure AI Search index from a file.
     
@@ -397,79 +555,151 @@ def create_index_from_file(index_name, file_path, file_type='markdown', doc_id=N
         file_path: Path to the file to process
         file_type: Type of file to process ('markdown', 'csv', 'word', 'powerpoint')
         doc_id: Unique identifier for the document (optional)
+        incremental: Only embed and upload chunks that are new or changed
+            since the document was last indexed
+        session_id: Session that uploaded the document (optional)
+        index_reused: Result of an ensure_index call the caller already made
+            for this index (optional); if None, ensure_index is called here
     """
     # Generate a unique doc_id if not provided
     if doc_id is None:
         doc_id = str(uuid.uuid4())
-    # If a search index already exists, delete it:
-    try:
-        index_definition = index_client.get_index(index_name)
-        index_client.delete_index(index_name)
-        logger.info(f"🗑️  Found existing index named '{index_name}', and deleted it")
-    except Exception:
-        logger.info(f"🗑️  No existing index named '{index_name}' found, so no need to delete it")
+    embeddings = get_embeddings()
+    search_client = get_search_client(index_name)
 
-    # Create an empty search index
-    try:
-        index_definition = create_index_definition(index_name, model=embeddings.model)
-        index_client.create_index(index_definition)
-        logger.info(f"Created index '{index_name}'")
-    except Exception as e:
-        logger.error(f"Error creating index: {e}")
-        raise
-          # Based on file type, process the file differently
-    docs = []
+    # Reuse the index when its schema is current, instead of deleting and recreating it
+    if index_reused is None:
+        try:
+            index_reused = ensure_index(index_name, model=embeddings.model)
+        except Exception as e:
+            logger.error(f"Error creating index: {e}")
+            raise
+
+    # When the index is reused, look up the chunks already indexed for this document
+    # so they can be replaced (or, in incremental mode, skipped when unchanged)
+    existing_hashes = {}
+    if index_reused:
+        try:
+            existing_hashes = get_indexed_hashes(search_client, doc_id)
+            logger.info(f"Found {len(existing_hashes)} indexed chunks for document {doc_id} in '{index_name}'")
+        except Exception as e:
+            logger.error(f"Error reading indexed chunks: {e}")
+            raise
+    incremental = incremental and bool(existing_hashes)
+
+    # The index is about to change, so cached answers built from it are stale
+    bump_index_version(index_name)
+
+    # Stream chunks through embedding and upload so early chunks are searchable
+    # while later pages are still being processed
+    seen_ids = set()
     try:
-        if file_type.lower() == 'csv':
-            # Create documents from the CSV file, generating vector embeddings
-            docs = create_docs_from_csv(path=file_path, content_column="description", model=embeddings.model)
-            # Add doc_id to each document
-            for doc in docs:
-                doc["doc_id"] = doc_id
-        elif file_type.lower() == 'markdown':
-            # Create documents from the markdown file, chunking and generating vector embeddings
-            docs = create_docs_from_markdown(path=file_path, model=embeddings.model, doc_id=doc_id)
-        elif file_type.lower() == 'word':
-            # Create documents from the Word document, generating vector embeddings
-            docs = create_docs_from_word(path=file_path, model=embeddings.model)
-            # Add doc_id to each document
-            for doc in docs:
-                doc["doc_id"] = doc_id
-        elif file_type.lower() == 'powerpoint':
-            # Create documents from the PowerPoint document, generating vector embeddings
-            docs = create_docs_from_powerpoint(path=file_path, model=embeddings.model)
-            # Add doc_id to each document
-            for doc in docs:
-                doc["doc_id"] = doc_id
-        else:
-            raise ValueError(f"Unsupported file type: {file_type}")
+        records = iter_chunks_from_file(file_path, file_type, doc_id, session_id=session_id)
+        action = "upload"
+        if existing_hashes:
+            records = iter_changed_chunks(records, existing_hashes if incremental else {}, seen_ids)
+            action = "merge_or_upload"
+        with SearchUploader(search_client, action=action) as uploader:
+            uploaded = run_ingestion(
+                records,
+                embeddings,
+                upload=uploader.add,
+                cache=get_embedding_cache()
+            )
     except Exception as e:
-        logger.error(f"Error processing file: {e}")
+        logger.error(f"Error indexing file: {e}")
         raise
-        
-    if not docs or len(docs) == 0:
+
+    # Remove chunks that are no longer part of the document
+    stale_ids = [chunk_id for chunk_id in existing_hashes if chunk_id not in seen_ids]
+    if stale_ids:
+        try:
+            SearchUploader(search_client, action="delete").upload_all([{"id": chunk_id} for chunk_id in stale_ids])
+        except Exception as e:
+            logger.error(f"Error deleting stale chunks: {e}")
+            raise
+
+    # Also invalidate answers cached while the document was being ingested
+    bump_index_version(index_name)
+
+    if incremental:
+        logger.info(f"Incremental update of '{index_name}': {uploaded} new or changed, "
+                    f"{len(seen_ids) - uploaded} unchanged, {len(stale_ids)} deleted")
+        return
+
+    if uploaded == 0:
         logger.warning(f"No documents were created from file: {file_path}")
         return
 
-    # Log document structure for debugging
-    if docs:
-        sample_doc = docs[0]
-        logger.info(f"Sample document keys: {list(sample_doc.keys())}")
-        logger.info(f"Document count: {len(docs)}")
+    logger.info(f"➕ Uploaded {uploaded} documents to '{index_name}' index")
 
-    # Add the documents to the index using the Azure AI Search client
-    try:
-        search_client = SearchClient(
-            endpoint=search_service_endpoint,
-            index_name=index_name,
-            credential=AzureKeyCredential(search_api_key)
-        )
+def chunk_content_hash(rec: dict) -> str:
+    """Return a hash of the indexed fields of a record (excluding its vector)."""
+    return text_hash("\x1f".join(str(rec.get(field, "")) for field in ("content", "title", "url", "filepath")))
 
-        search_client.upload_documents(docs)
-        logger.info(f"➕ Uploaded {len(docs)} documents to '{index_name}' index")
-    except Exception as e:
-        logger.error(f"Error uploading documents to index: {e}")
-        raise
+def get_indexed_hashes(search_client, doc_id: str) -> dict[str, str]:
+    """Return a mapping of chunk id to content hash for a document's indexed chunks."""
+    escaped_doc_id = doc_id.replace("'", "''")
+    results = search_client.search(
+        search_text="*",
+        filter=f"doc_id eq '{escaped_doc_id}'",
+        select=["id", "content_hash"]
+    )
+    return {result["id"]: result.get("content_hash") for result in results}
+
+def iter_changed_chunks(records, existing_hashes: dict[str, str], seen_ids: set) -> Iterator[dict[str, any]]:
+    """
+    Yield only records whose content hash differs from what is already indexed.
+    
+    Args:
+        records: Records produced by iter_chunks_from_file
+        existing_hashes: Mapping of chunk id to content hash already in the index
+        seen_ids: Set that is filled with the id of every record, changed or not
+    """
+    for rec in records:
+        seen_ids.add(rec["id"])
+        if existing_hashes.get(rec["id"]) != rec["content_hash"]:
+            yield rec
+
+def iter_chunks_from_file(file_path, file_type, doc_id, session_id=None):
+    """
+    Yield records (without vectors) for a file, based on its type.
+    
+    Chunk ids are prefixed with the doc_id so they stay unique when several
+    documents share an index.
+    
+    Args:
+        file_path: Path to the file to process
+        file_type: Type of file to process ('markdown', 'csv', 'word', 'powerpoint')
+        doc_id: Unique identifier for the document
+        session_id: Session that uploaded the document (optional)
+    """
+    if file_type.lower() == 'csv':
+        records = iter_rows_from_csv(path=file_path, content_column="description")
+    elif file_type.lower() == 'markdown':
+        records = iter_chunks_from_markdown(path=file_path, doc_id=doc_id)
+    elif file_type.lower() == 'word':
+        markdown_path, chunk_size, chunk_overlap = convert_word_to_markdown(file_path)
+        records = iter_chunks_from_markdown(path=markdown_path, chunk_size=chunk_size,
+                                            chunk_overlap=chunk_overlap, doc_id=doc_id)
+    elif file_type.lower() == 'powerpoint':
+        markdown_path, chunk_size, chunk_overlap = convert_powerpoint_to_markdown(file_path)
+        records = iter_chunks_from_markdown(path=markdown_path, chunk_size=chunk_size,
+                                            chunk_overlap=chunk_overlap, doc_id=doc_id)
+    else:
+        raise ValueError(f"Unsupported file type: {file_type}")
+
+    for rec in records:
+        rec["id"] = f"{doc_id}_{rec['id']}"
+        rec["doc_id"] = doc_id
+        rec["session_id"] = session_id or ""
+        if file_type.lower() in ('word', 'powerpoint'):
+            # Point filepath at the original Office document
+            rec["filepath"] = file_path
+        if "token_count" not in rec:
+            rec["token_count"] = count_tokens(str(rec["content"]))
+        rec["content_hash"] = chunk_content_hash(rec)
+        yield rec
 
 # if __name__ == "__main__":
 #     import argparse
@@ -500,22 +730,20 @@ def create_index_from_file(index_name, file_path, file_type='markdown', doc_id=N
 #     create_index_from_file(index_name, file_path, file_type)
 #     logger.info("Index created.")
 
-def create_docs_from_word(path: str, model: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> list[dict[str, any]]:
+def convert_word_to_markdown(path: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> tuple[str, int, int]:
     """
-    Process a Word document and generate vector embeddings for each chunk.
+    Convert a Word document to a temporary markdown file.
     
     This function extracts text from Word documents while preserving structure
-    such as headings, paragraphs, and tables, then converts to markdown format
-    for consistent processing.
+    such as headings, paragraphs, and tables.
     
     Args:
         path: Path to the Word document
-        model: The embedding model name to use
         chunk_size: Base size for text chunks
         chunk_overlap: Overlap between consecutive chunks
         
     Returns:
-        List of document records with embeddings and metadata
+        Tuple of (markdown path, chunk size, chunk overlap) tuned for Word content
     """
     if not HAS_OFFICE_SUPPORT:
         raise ImportError("python-docx is not installed. Install with: pip install python-docx")
@@ -594,13 +822,33 @@ def create_docs_from_word(path: str, model: str, chunk_size: int = 1000, chunk_o
     word_chunk_size = min(chunk_size * 1.2, 1800)  # Larger chunks for Word docs
     word_chunk_overlap = min(chunk_overlap * 1.5, 350)  # More overlap to maintain context
     
+    return str(temp_markdown_path), int(word_chunk_size), int(word_chunk_overlap)
+
+def create_docs_from_word(path: str, model: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> list[dict[str, any]]:
+    """
+    Process a Word document and generate vector embeddings for each chunk.
+    
+    The document is converted to markdown format with convert_word_to_markdown
+    for consistent processing.
+    
+    Args:
+        path: Path to the Word document
+        model: The embedding model name to use
+        chunk_size: Base size for text chunks
+        chunk_overlap: Overlap between consecutive chunks
+        
+    Returns:
+        List of document records with embeddings and metadata
+    """
+    markdown_path, word_chunk_size, word_chunk_overlap = convert_word_to_markdown(path, chunk_size, chunk_overlap)
+    
     # Use existing markdown processing
     try:
         docs = create_docs_from_markdown(
-            path=str(temp_markdown_path),
+            path=markdown_path,
             model=model,
-            chunk_size=int(word_chunk_size),
-            chunk_overlap=int(word_chunk_overlap)
+            chunk_size=word_chunk_size,
+            chunk_overlap=word_chunk_overlap
         )
         
         # Update filepath to point to original Word document
@@ -617,22 +865,20 @@ def create_docs_from_word(path: str, model: str, chunk_size: int = 1000, chunk_o
         logger.error(traceback.format_exc())
         raise
 
-def create_docs_from_powerpoint(path: str, model: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> list[dict[str, any]]:
+def convert_powerpoint_to_markdown(path: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> tuple[str, int, int]:
     """
-    Process a PowerPoint presentation and generate vector embeddings for each chunk.
+    Convert a PowerPoint presentation to a temporary markdown file.
     
     This function extracts text from PowerPoint slides while preserving structure
-    such as titles, content, and notes, then converts to markdown format for 
-    consistent processing.
+    such as titles, content, and notes.
     
     Args:
         path: Path to the PowerPoint document
-        model: The embedding model name to use
         chunk_size: Base size for text chunks
         chunk_overlap: Overlap between consecutive chunks
         
     Returns:
-        List of document records with embeddings and metadata
+        Tuple of (markdown path, chunk size, chunk overlap) tuned for slide content
     """
     if not HAS_OFFICE_SUPPORT:
         raise ImportError("python-pptx is not installed. Install with: pip install python-pptx")
@@ -697,13 +943,33 @@ def create_docs_from_powerpoint(path: str, model: str, chunk_size: int = 1000, c
     ppt_chunk_size = min(chunk_size * 0.8, 1500)  # Smaller chunks than Word docs
     ppt_chunk_overlap = min(chunk_overlap * 1.5, 350)  # More overlap to maintain context
     
+    return str(temp_markdown_path), int(ppt_chunk_size), int(ppt_chunk_overlap)
+
+def create_docs_from_powerpoint(path: str, model: str, chunk_size: int = 1000, chunk_overlap: int = 200) -> list[dict[str, any]]:
+    """
+    Process a PowerPoint presentation and generate vector embeddings for each chunk.
+    
+    The presentation is converted to markdown format with
+    convert_powerpoint_to_markdown for consistent processing.
+    
+    Args:
+        path: Path to the PowerPoint document
+        model: The embedding model name to use
+        chunk_size: Base size for text chunks
+        chunk_overlap: Overlap between consecutive chunks
+        
+    Returns:
+        List of document records with embeddings and metadata
+    """
+    markdown_path, ppt_chunk_size, ppt_chunk_overlap = convert_powerpoint_to_markdown(path, chunk_size, chunk_overlap)
+    
     # Use existing markdown processing
     try:
         docs = create_docs_from_markdown(
-            path=str(temp_markdown_path),
+            path=markdown_path,
             model=model,
-            chunk_size=int(ppt_chunk_size),
-            chunk_overlap=int(ppt_chunk_overlap)
+            chunk_size=ppt_chunk_size,
+            chunk_overlap=ppt_chunk_overlap
         )
         
         # Update filepath to point to original PowerPoint document
@@ -20,7 +20,9 @@ logger = logging.getLogger(__name__)
 
 def test_word_processing():
     """Test Word document processing"""
-    from create_index_from_file import create_docs_from_word, embeddings
+    from create_index_from_file import create_docs_from_word
+    from clients import get_embeddings
+    embeddings = get_embeddings()
     
     # Log file path
     logger.info(f"Logging to: {log_file}")
@@ -53,7 +55,9 @@ def test_word_processing():
 
 def test_powerpoint_processing():
     """Test PowerPoint document processing"""
-    from create_index_from_file import create_docs_from_powerpoint, embeddings
+    from create_index_from_file import create_docs_from_powerpoint
+    from clients import get_embeddings
+    embeddings = get_embeddings()
     
     # Path to test PowerPoint file
     ppt_file = "sample_docs/Industrial_Real_Estate_Trends_Midwest_2020_2025.pptx"
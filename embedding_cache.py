@@ -0,0 +1,209 @@
+"""
+Persistent Embedding Cache
+
+This module provides an on-disk cache of embedding vectors stored in SQLite.
+Entries are keyed by the embedding model, the vector dimensions and the
+sha256 of the chunk text, so re-uploaded documents (or shared boilerplate
+pages) are embedded once and then served from disk. The cache is bounded in
+size and evicts the least recently used vectors first.
+
+Question embeddings are also kept in a small in-process LRU, so repeated
+questions skip the embedding round-trip entirely.
+"""
+
+import os
+import re
+import time
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from config import get_logger
+from sqlite_cache import SqliteLruCache, open_cache
+
+logger = get_logger(__name__)
+
+# Cache settings
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", os.path.join(".cache", "embeddings.sqlite3"))
+EMBEDDING_CACHE_MAX_MB = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "512"))
+
+# Number of question embeddings kept in memory
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "1024"))
+# Also store question embeddings in the persistent cache
+QUERY_CACHE_PERSIST = os.getenv("QUERY_CACHE_PERSIST", "true").lower() == "true"
+
+
+def text_hash(text: str) -> str:
+    """Return the sha256 hex digest of a chunk of text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache(SqliteLruCache):
+    """SQLite-backed LRU cache of embedding vectors."""
+
+    table = "embeddings"
+    value_columns = "model TEXT NOT NULL, dimensions INTEGER NOT NULL, vector BLOB NOT NULL"
+    description = "embedding cache"
+
+    def __init__(self, path: str = EMBEDDING_CACHE_PATH, max_bytes: int = EMBEDDING_CACHE_MAX_MB * 1024 * 1024):
+        super().__init__(path, max_bytes)
+
+    @staticmethod
+    def make_key(model: str, dimensions: int, text: str) -> str:
+        """Build the cache key for a chunk of text."""
+        return f"{model}:{dimensions}:{text_hash(text)}"
+
+    def get_many(self, model: str, dimensions: int, texts: List[str]) -> Dict[int, List[float]]:
+        """Look up cached vectors for a list of texts.
+
+        Returns:
+            A dict mapping the index of each text found in the cache to its vector
+        """
+        keys = [self.make_key(model, dimensions, text) for text in texts]
+        positions = {}
+        for i, key in enumerate(keys):
+            positions.setdefault(key, []).append(i)
+
+        found = {}
+        unique_keys = list(positions)
+        with self._lock:
+            # Stay well below SQLite's bound-parameter limit
+            for start in range(0, len(unique_keys), 500):
+                batch = unique_keys[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    for i in positions[key]:
+                        found[i] = vector.tolist()
+
+            if found:
+                self._touch({keys[i] for i in found})
+
+        return found
+
+    def put_many(self, model: str, dimensions: int, texts: List[str], vectors: List[List[float]]):
+        """Store vectors for a list of texts, evicting old entries if needed."""
+        now = time.time()
+        rows = []
+        for text, vector in zip(texts, vectors):
+            blob = array("f", vector).tobytes()
+            rows.append((self.make_key(model, dimensions, text), model, dimensions, blob, len(blob), now))
+
+        if not rows:
+            return
+
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, model, dimensions, vector, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            self._conn.commit()
+            self._evict()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> Optional[EmbeddingCache]:
+    """Return the process-wide embedding cache, or None if caching is disabled."""
+    global _cache
+    if not EMBEDDING_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = open_cache(EmbeddingCache, EMBEDDING_CACHE_PATH)
+    return _cache
+
+
+def normalize_question(question: str) -> str:
+    """Normalise a question for cache lookups (case, whitespace, trailing punctuation)."""
+    return re.sub(r"\s+", " ", question).strip().rstrip("?!. ").lower()
+
+
+class QueryEmbeddingCache:
+    """In-process LRU cache of question embeddings with hit/miss counters.
+
+    Misses can fall through to the persistent EmbeddingCache before calling
+    the embedding service.
+    """
+
+    def __init__(self, max_size: int = QUERY_CACHE_SIZE, backing_cache: Optional[EmbeddingCache] = None):
+        self.max_size = max_size
+        self.backing_cache = backing_cache
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def embed_query(self, embeddings, question: str) -> List[float]:
+        """Return the embedding of a question, from cache when possible."""
+        # Imported here to avoid a circular import with embedding_engine
+        from embedding_engine import get_embedding_dimensions
+
+        model = getattr(embeddings, "model", "unknown")
+        dimensions = get_embedding_dimensions(embeddings)
+        normalized = normalize_question(question)
+        key = (model, dimensions, normalized)
+
+        with self._lock:
+            vector = self._entries.get(key)
+            if vector is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return vector
+            self.misses += 1
+
+        # Question entries get their own model namespace in the persistent cache, so a
+        # chunk whose text equals a normalised question never reuses its vector
+        query_model = f"query:{model}"
+        vector = None
+        if self.backing_cache is not None:
+            try:
+                vector = self.backing_cache.get_many(query_model, dimensions, [normalized]).get(0)
+            except Exception as e:
+                logger.warning(f"Embedding cache lookup failed: {e}")
+
+        if vector is None:
+            vector = embeddings.embed_query(question)
+            if self.backing_cache is not None:
+                try:
+                    self.backing_cache.put_many(query_model, dimensions, [normalized], [vector])
+                except Exception as e:
+                    logger.warning(f"Embedding cache write failed: {e}")
+
+        with self._lock:
+            self._entries[key] = vector
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+        logger.debug(f"Query embedding cache: {self.stats()}")
+        return vector
+
+    def stats(self) -> Dict[str, int]:
+        """Return hit/miss counters and the current size."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries)}
+
+
+_query_cache = None
+
+
+def get_query_embedding_cache() -> QueryEmbeddingCache:
+    """Return the process-wide question embedding cache."""
+    global _query_cache
+    with _cache_lock:
+        if _query_cache is None:
+            _query_cache = QueryEmbeddingCache()
+    if QUERY_CACHE_PERSIST and _query_cache.backing_cache is None:
+        _query_cache.backing_cache = get_embedding_cache()
+    return _query_cache
@@ -0,0 +1,301 @@
+"""
+Embedding Engine
+
+This module batches text chunks into embed_documents requests so that a
+document is embedded in a handful of round-trips instead of one request per
+chunk. Batches are sized by both the number of inputs and an estimated token
+count, and vectors are always returned in the same order as the input texts.
+Vectors already present in the persistent embedding cache are not requested.
+
+Batches are sent concurrently from a small thread pool. A process-wide rate
+limiter keeps requests within the configured tokens-per-minute and
+requests-per-minute budget, and throttled or transient failures are retried
+with jittered backoff, honouring any Retry-After header from the service.
+"""
+
+import os
+import time
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Optional
+
+from config import get_logger
+
+logger = get_logger(__name__)
+
+# Maximum number of inputs sent in a single embeddings request
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "16"))
+# Maximum (estimated) number of tokens sent in a single embeddings request
+EMBEDDING_BATCH_MAX_TOKENS = int(os.getenv("EMBEDDING_BATCH_MAX_TOKENS", "8000"))
+# Maximum number of embeddings requests in flight at once
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+# Deployment quota; 0 disables the corresponding limit
+EMBEDDING_TPM_LIMIT = int(os.getenv("EMBEDDING_TPM_LIMIT", "120000"))
+EMBEDDING_RPM_LIMIT = int(os.getenv("EMBEDDING_RPM_LIMIT", "720"))
+# Retries per batch for throttling and transient errors
+EMBEDDING_MAX_RETRIES = int(os.getenv("EMBEDDING_MAX_RETRIES", "6"))
+EMBEDDING_RETRY_BASE_SECONDS = 1.0
+EMBEDDING_RETRY_MAX_SECONDS = 60.0
+
+# Vector dimensions produced by the supported embedding models
+EMBEDDING_DIMENSIONS = {
+    "text-embedding-ada-002": 1536,
+    "text-embedding-3-small": 1536,
+    "text-embedding-3-large": 3072,
+}
+
+
+def get_embedding_dimensions(embeddings) -> int:
+    """Return the vector dimensions produced by an embeddings object."""
+    dimensions = getattr(embeddings, "dimensions", None)
+    if dimensions:
+        return dimensions
+    return EMBEDDING_DIMENSIONS.get(getattr(embeddings, "model", None), 1536)
+
+
+class RateLimiter:
+    """Sliding-window limiter for tokens-per-minute and requests-per-minute.
+
+    acquire() blocks until a request of the given size fits in the budget of
+    the last 60 seconds. pause() stops all callers until a deadline, which is
+    used when the service answers with a Retry-After header.
+    """
+
+    WINDOW_SECONDS = 60.0
+
+    def __init__(self, tokens_per_minute: int = 0, requests_per_minute: int = 0):
+        self.tokens_per_minute = tokens_per_minute
+        self.requests_per_minute = requests_per_minute
+        self._lock = threading.Lock()
+        self._events = deque()  # (timestamp, tokens)
+        self._tokens_in_window = 0
+        self._paused_until = 0.0
+
+    def _purge(self, now: float):
+        while self._events and now - self._events[0][0] >= self.WINDOW_SECONDS:
+            _, tokens = self._events.popleft()
+            self._tokens_in_window -= tokens
+
+    def acquire(self, tokens: int):
+        """Block until a request using the given number of tokens may be sent."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._purge(now)
+                wait = self._paused_until - now
+
+                if wait <= 0:
+                    over_tokens = (self.tokens_per_minute and self._events
+                                   and self._tokens_in_window + tokens > self.tokens_per_minute)
+                    over_requests = (self.requests_per_minute
+                                     and len(self._events) >= self.requests_per_minute)
+                    if not over_tokens and not over_requests:
+                        self._events.append((now, tokens))
+                        self._tokens_in_window += tokens
+                        return
+                    # Wait until the oldest request leaves the window
+                    wait = self._events[0][0] + self.WINDOW_SECONDS - now
+
+            time.sleep(max(wait, 0.05))
+
+    def pause(self, seconds: float):
+        """Hold back every caller for the given number of seconds."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+
+_rate_limiter = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """Return the process-wide embeddings rate limiter shared by all uploads."""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter(EMBEDDING_TPM_LIMIT, EMBEDDING_RPM_LIMIT)
+    return _rate_limiter
+
+
+def _retry_after_seconds(error: Exception) -> Optional[float]:
+    """Extract the Retry-After delay from an OpenAI/HTTP error, if present."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+def _is_retryable(error: Exception) -> bool:
+    """Return True for throttling, server-side and connection errors."""
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    if status_code is not None:
+        return status_code in (408, 409, 429) or status_code >= 500
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError", "Timeout", "ConnectionError")
+
+
+def _embed_batch_with_retry(embeddings, texts: List[str], rate_limiter: RateLimiter, max_retries: int,
+                            tokens: int) -> List[List[float]]:
+    """Embed one batch, waiting for rate-limit budget and retrying transient errors."""
+    attempt = 0
+    while True:
+        rate_limiter.acquire(tokens)
+        try:
+            return embeddings.embed_documents(texts)
+        except Exception as e:
+            if attempt >= max_retries or not _is_retryable(e):
+                raise
+
+            retry_after = _retry_after_seconds(e)
+            if retry_after is not None:
+                # The service told us how long to back off; hold back every worker
+                delay = retry_after + random.uniform(0, 1)
+                rate_limiter.pause(delay)
+            else:
+                # Exponential backoff with full jitter
+                delay = random.uniform(0, min(EMBEDDING_RETRY_MAX_SECONDS, EMBEDDING_RETRY_BASE_SECONDS * 2 ** attempt))
+
+            attempt += 1
+            logger.warning(f"Embedding request failed ({e}); retry {attempt}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in a piece of text.
+
+    Uses the common ~4 characters per token heuristic for English text, which
+    is close enough for sizing batches without loading a tokenizer.
+    """
+    return max(1, len(text) // 4)
+
+
+def pack_batches(texts: List[str], max_batch_size: int = None, max_batch_tokens: int = None,
+                 token_counts: List[int] = None) -> List[List[int]]:
+    """Group texts into batches that respect the request limits.
+
+    Args:
+        texts: The texts to embed
+        max_batch_size: Maximum number of texts per batch
+        max_batch_tokens: Maximum estimated tokens per batch
+        token_counts: Known token count of each text (estimated when missing)
+
+    Returns:
+        A list of batches, each batch being a list of indices into texts.
+        A single text larger than max_batch_tokens gets a batch of its own.
+    """
+    max_batch_size = max_batch_size or EMBEDDING_BATCH_SIZE
+    max_batch_tokens = max_batch_tokens or EMBEDDING_BATCH_MAX_TOKENS
+
+    batches = []
+    current = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        tokens = token_counts[i] if token_counts and token_counts[i] else estimate_tokens(text)
+        if current and (len(current) >= max_batch_size or current_tokens + tokens > max_batch_tokens):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append(i)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def embed_texts(embeddings, texts: List[str], max_batch_size: int = None, max_batch_tokens: int = None,
+                cache=None, max_concurrency: int = None, rate_limiter: RateLimiter = None,
+                max_retries: int = None, token_counts: List[int] = None) -> List[List[float]]:
+    """Generate embeddings for a list of texts using batched, concurrent requests.
+
+    Args:
+        embeddings: A LangChain embeddings object (e.g. AzureOpenAIEmbeddings)
+        texts: The texts to embed
+        max_batch_size: Maximum number of texts per request
+        max_batch_tokens: Maximum estimated tokens per request
+        cache: Optional EmbeddingCache consulted before calling the service
+        max_concurrency: Maximum number of requests in flight
+        rate_limiter: Limiter enforcing the TPM/RPM budget (defaults to the shared one)
+        max_retries: Retries per batch for throttling and transient errors
+        token_counts: Known token count of each text, used to size batches
+
+    Returns:
+        A list of embedding vectors in the same order as texts
+    """
+    if not texts:
+        return []
+
+    vectors = [None] * len(texts)
+    model = getattr(embeddings, "model", "unknown")
+    dimensions = get_embedding_dimensions(embeddings)
+
+    # Serve whatever we can from the persistent cache
+    if cache is not None:
+        try:
+            for i, vector in cache.get_many(model, dimensions, texts).items():
+                vectors[i] = vector
+        except Exception as e:
+            logger.warning(f"Embedding cache lookup failed: {e}")
+
+    # Group the remaining positions by text so repeated chunks are embedded once
+    missing = {}
+    for i, vector in enumerate(vectors):
+        if vector is None:
+            missing.setdefault(texts[i], []).append(i)
+    if not missing:
+        logger.info(f"All {len(texts)} chunk embeddings served from cache")
+        return vectors
+
+    missing_texts = list(missing)
+    missing_tokens = [token_counts[missing[text][0]] for text in missing_texts] if token_counts else None
+    batches = pack_batches(missing_texts, max_batch_size, max_batch_tokens, missing_tokens)
+    logger.info(f"Embedding {len(missing_texts)} of {len(texts)} chunks in {len(batches)} batched requests")
+
+    max_concurrency = max_concurrency or EMBEDDING_MAX_CONCURRENCY
+    rate_limiter = rate_limiter or get_rate_limiter()
+    max_retries = EMBEDDING_MAX_RETRIES if max_retries is None else max_retries
+
+    workers = max(1, min(max_concurrency, len(batches)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embed") as executor:
+        futures = {}
+        for batch in batches:
+            batch_texts = [missing_texts[i] for i in batch]
+            batch_tokens = sum(missing_tokens[i] if missing_tokens and missing_tokens[i] else estimate_tokens(missing_texts[i])
+                               for i in batch)
+            future = executor.submit(_embed_batch_with_retry, embeddings, batch_texts, rate_limiter, max_retries,
+                                     batch_tokens)
+            futures[future] = batch_texts
+
+        try:
+            for future in as_completed(futures):
+                batch_texts = futures[future]
+                batch_vectors = future.result()
+                if len(batch_vectors) != len(batch_texts):
+                    raise ValueError(f"Expected {len(batch_texts)} embeddings but received {len(batch_vectors)}")
+                for text, vector in zip(batch_texts, batch_vectors):
+                    for i in missing[text]:
+                        vectors[i] = vector
+
+                if cache is not None:
+                    try:
+                        cache.put_many(model, dimensions, batch_texts, batch_vectors)
+                    except Exception as e:
+                        logger.warning(f"Embedding cache write failed: {e}")
+        except Exception:
+            # Don't start batches that are still queued once one has failed for good
+            for pending in futures:
+                pending.cancel()
+            raise
+
+    return vectors
@@ -0,0 +1,127 @@
+"""
+Streaming Ingestion Pipeline
+
+This module connects the chunk -> embed -> upload stages of ingestion with
+bounded queues. Each stage runs in its own thread, so the first chunks are
+uploaded (and searchable) while later pages are still being chunked and
+embedded, and peak memory is bounded by the queue depths rather than by the
+size of the document.
+"""
+
+import os
+import queue
+import threading
+from typing import Callable, Iterable, Iterator, List
+
+from config import get_logger
+from embedding_engine import embed_texts, EMBEDDING_BATCH_SIZE, EMBEDDING_MAX_CONCURRENCY
+
+logger = get_logger(__name__)
+
+# Maximum number of records buffered between two stages
+PIPELINE_QUEUE_DEPTH = int(os.getenv("PIPELINE_QUEUE_DEPTH", "256"))
+# Number of documents sent per upload request
+UPLOAD_BATCH_SIZE = int(os.getenv("UPLOAD_BATCH_SIZE", "100"))
+
+_DONE = object()
+
+
+class _StageError:
+    """Wraps an exception raised by a background stage."""
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+
+def prefetch(iterable: Iterable, maxsize: int = None, name: str = "stage") -> Iterator:
+    """Run an iterable in a background thread, buffering into a bounded queue.
+
+    Exceptions raised by the producer are re-raised in the consumer. If the
+    consumer stops early the producer thread is told to stop as well.
+    """
+    buffer = queue.Queue(maxsize=maxsize or PIPELINE_QUEUE_DEPTH)
+    stop = threading.Event()
+
+    def put(item) -> bool:
+        while not stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            for item in iterable:
+                if not put(item):
+                    return
+            put(_DONE)
+        except Exception as e:
+            put(_StageError(e))
+
+    thread = threading.Thread(target=produce, name=f"ingest-{name}", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _DONE:
+                return
+            if isinstance(item, _StageError):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
+
+
+def batched(iterable: Iterable, size: int) -> Iterator[List]:
+    """Yield lists of up to size items from an iterable."""
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def embed_records(records: Iterable[dict], embeddings, cache=None, group_size: int = None) -> Iterator[dict]:
+    """Add a contentVector to each record, embedding them in groups.
+
+    Records are grouped so that each embed_texts call has enough batches to
+    keep every concurrent request slot busy.
+    """
+    group_size = group_size or EMBEDDING_BATCH_SIZE * EMBEDDING_MAX_CONCURRENCY
+    for group in batched(records, group_size):
+        vectors = embed_texts(embeddings, [rec["content"] for rec in group], cache=cache,
+                              token_counts=[rec.get("token_count") for rec in group])
+        for rec, vector in zip(group, vectors):
+            rec["contentVector"] = vector
+            yield rec
+
+
+def run_ingestion(records: Iterable[dict], embeddings, upload: Callable[[List[dict]], None],
+                  cache=None, upload_batch_size: int = None) -> int:
+    """Stream records through the embed and upload stages.
+
+    Args:
+        records: Iterable of records without vectors (typically a chunking generator)
+        embeddings: A LangChain embeddings object
+        upload: Callable that uploads a list of embedded records
+        cache: Optional EmbeddingCache
+        upload_batch_size: Number of records per upload call
+
+    Returns:
+        The number of records uploaded
+    """
+    upload_batch_size = upload_batch_size or UPLOAD_BATCH_SIZE
+    chunks = prefetch(records, name="chunk")
+    embedded = prefetch(embed_records(chunks, embeddings, cache=cache), name="embed")
+
+    uploaded = 0
+    for batch in batched(embedded, upload_batch_size):
+        upload(batch)
+        uploaded += len(batch)
+        logger.info(f"Uploaded {uploaded} records so far")
+    return uploaded
@@ -0,0 +1,93 @@
+"""
+PDF Conversion Cache
+
+This module provides an on-disk cache of the markdown produced from PDFs, by
+Document Intelligence OCR or by native text extraction. Entries are keyed by
+the sha256 of the file bytes plus a description of the conversion (OCR model
+and converter version), so re-uploading the same PDF skips parsing and OCR
+entirely. The cache is stored in SQLite, bounded in size and evicts the least
+recently used entries first.
+"""
+
+import os
+import time
+import hashlib
+import threading
+from typing import Optional
+
+from config import get_logger
+from sqlite_cache import SqliteLruCache, open_cache
+
+logger = get_logger(__name__)
+
+# Cache settings
+PDF_CACHE_ENABLED = os.getenv("PDF_CACHE_ENABLED", "true").lower() == "true"
+PDF_CACHE_PATH = os.getenv("PDF_CACHE_PATH", os.path.join(".cache", "pdf_markdown.sqlite3"))
+PDF_CACHE_MAX_MB = int(os.getenv("PDF_CACHE_MAX_MB", "256"))
+
+# Files are hashed in blocks to keep memory flat for large scans
+_HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_hash(file_path: str) -> str:
+    """Return the sha256 hex digest of a file's bytes."""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PdfCache(SqliteLruCache):
+    """SQLite-backed LRU cache of converted PDF markdown."""
+
+    table = "conversions"
+    value_columns = "markdown TEXT NOT NULL"
+    description = "PDF cache"
+    eviction_batch = 64
+
+    def __init__(self, path: str = PDF_CACHE_PATH, max_bytes: int = PDF_CACHE_MAX_MB * 1024 * 1024):
+        super().__init__(path, max_bytes)
+
+    @staticmethod
+    def make_key(digest: str, converter: str) -> str:
+        """Build the cache key for a file hash and conversion description."""
+        return f"{converter}:{digest}"
+
+    def get(self, digest: str, converter: str) -> Optional[str]:
+        """Return the cached markdown for a file, or None."""
+        key = self.make_key(digest, converter)
+        with self._lock:
+            row = self._conn.execute("SELECT markdown FROM conversions WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._touch([key])
+        return row[0]
+
+    def put(self, digest: str, converter: str, markdown: str):
+        """Store the markdown for a file, evicting old entries if needed."""
+        size = len(markdown.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO conversions (key, markdown, size, last_used) VALUES (?, ?, ?, ?)",
+                (self.make_key(digest, converter), markdown, size, time.time()),
+            )
+            self._conn.commit()
+            self._evict()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_pdf_cache() -> Optional[PdfCache]:
+    """Return the process-wide PDF cache, or None if caching is disabled."""
+    global _cache
+    if not PDF_CACHE_ENABLED:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = open_cache(PdfCache, PDF_CACHE_PATH)
+    return _cache
@@ -5,53 +5,243 @@ This module contains functions to process PDFs, including:
 1. Detecting if a PDF is image-based or has extractable text
 2. Converting PDFs to markdown format
 3. Processing with Azure Document Intelligence for image-based PDFs
+4. OCRing only the scanned pages of PDFs that mix native and scanned pages
+5. Caching converted markdown by file content
 """
 
+import io
 import os
+import re
 import tempfile
 import logging
+import time
+import random
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
+from typing import Dict, List
 import PyPDF2
-from pdfminer.high_level import extract_text
-from pdfminer.pdfparser import PDFSyntaxError
+from PyPDF2.errors import PdfReadError
 
-from azure.core.credentials import AzureKeyCredential
-from azure.ai.documentintelligence import DocumentIntelligenceClient
+from azure.core.exceptions import ServiceRequestError, ServiceResponseError
+import azure.ai.documentintelligence as documentintelligence
 from azure.ai.documentintelligence.models import AnalyzeDocumentRequest, DocumentContentFormat, AnalyzeResult
 from azure.storage.blob import BlobServiceClient
 
+from clients import get_document_intelligence_client
+from pdf_cache import get_pdf_cache, file_hash
 from config import get_logger
 
 logger = get_logger(__name__)
 
+# Document Intelligence model used for OCR
+OCR_MODEL = "prebuilt-layout"
+# Identifies the conversion in the PDF cache; bump the version when the markdown output changes
+PDF_CONVERTER_ID = f"{OCR_MODEL}:sdk={getattr(documentintelligence, '__version__', 'unknown')}:v1"
+
+# OCR just the scanned pages of PDFs that also have native text pages
+PDF_HYBRID_OCR = os.getenv("PDF_HYBRID_OCR", "true").lower() == "true"
+# Native PDFs with at least this many pages are extracted by a pool of processes
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "50"))
+# Defaults to the number of CPU cores
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS") or os.cpu_count() or 1)
+# Scans longer than this are analyzed by Document Intelligence in concurrent page ranges
+PDF_OCR_RANGE_PAGES = int(os.getenv("PDF_OCR_RANGE_PAGES", "50"))
+PDF_OCR_MAX_CONCURRENCY = int(os.getenv("PDF_OCR_MAX_CONCURRENCY", "4"))
+PDF_OCR_MAX_RETRIES = int(os.getenv("PDF_OCR_MAX_RETRIES", "3"))
+
+# Page classifications
+PAGE_TEXT = "text"
+PAGE_IMAGE = "image"
+PAGE_EMPTY = "empty"
+
+# A text object (BT ... ET) that shows text with Tj or TJ
+_TEXT_OPERATORS = re.compile(rb"\bBT\b.*?(?:Tj|TJ)", re.DOTALL)
+
+class PdfClassification:
+    """Per-page classification of a PDF as text, image (scanned) or empty pages.
+    
+    page_types maps 0-based page numbers to PAGE_TEXT, PAGE_IMAGE or
+    PAGE_EMPTY. When the sampled pages agreed, only they are classified.
+    """
+    
+    def __init__(self, page_count: int, page_types: Dict[int, str], sampled: bool):
+        self.page_count = page_count
+        self.page_types = page_types
+        self.sampled = sampled
+    
+    @property
+    def is_image_based(self) -> bool:
+        """True if no classified page has extractable text."""
+        return PAGE_TEXT not in self.page_types.values()
+    
+    @property
+    def is_mixed(self) -> bool:
+        """True if the PDF has both text pages and scanned pages."""
+        types = set(self.page_types.values())
+        return PAGE_TEXT in types and PAGE_IMAGE in types
+    
+    def pages_of_type(self, page_type: str) -> List[int]:
+        """Return the 0-based numbers of the classified pages of a type."""
+        return sorted(number for number, kind in self.page_types.items() if kind == page_type)
+
+def _has_text_operators(stream) -> bool:
+    try:
+        data = stream.get_data()
+    except Exception:
+        return False
+    return bool(data) and _TEXT_OPERATORS.search(data) is not None
+
+def classify_page(page) -> str:
+    """Classify a page from its content stream and resources, without extracting text.
+    
+    A page has text if it (or a form XObject it draws) has text-showing
+    operators and fonts to draw them with.
+    """
+    resources = page.get("/Resources")
+    resources = resources.get_object() if resources is not None else {}
+    fonts = resources.get("/Font")
+    contents = page.get_contents()
+    if fonts and contents is not None and _has_text_operators(contents):
+        return PAGE_TEXT
+    
+    has_image = False
+    xobjects = resources.get("/XObject")
+    for xobject in (xobjects.get_object().values() if xobjects else []):
+        xobject = xobject.get_object()
+        subtype = xobject.get("/Subtype")
+        if subtype == "/Image":
+            has_image = True
+        elif subtype == "/Form":
+            form_resources = xobject.get("/Resources")
+            form_fonts = form_resources.get_object().get("/Font") if form_resources is not None else None
+            if (fonts or form_fonts) and _has_text_operators(xobject):
+                return PAGE_TEXT
+            if form_resources is not None and form_resources.get_object().get("/XObject"):
+                # Scanners often wrap the page image in a form XObject
+                has_image = True
+    return PAGE_IMAGE if has_image else PAGE_EMPTY
+
+def _sample_pages(page_count: int) -> List[int]:
+    """Return the first, middle and last page numbers."""
+    return sorted({0, page_count // 2, page_count - 1})
+
+def classify_pdf(file_path, pdf_reader=None, full_scan=False) -> PdfClassification:
+    """Classify the pages of a PDF, stopping early when a sample is conclusive.
+    
+    The first, middle and last pages are classified first. If every sampled
+    page with content is the same kind, the PDF is assumed to be uniformly
+    native or scanned; otherwise every page is classified.
+    
+    A sample can miss a few scanned pages in a mostly native PDF, so callers
+    that OCR individual scanned pages pass full_scan=True to classify every
+    page. classify_page only reads content streams and resources, so this
+    stays cheap compared with extracting the text.
+    """
+    if pdf_reader is None:
+        with open(file_path, "rb") as pdf_file:
+            return classify_pdf(file_path, PyPDF2.PdfReader(pdf_file), full_scan)
+    
+    page_count = len(pdf_reader.pages)
+    if page_count == 0:
+        return PdfClassification(0, {}, sampled=False)
+    
+    page_types = {number: classify_page(pdf_reader.pages[number]) for number in _sample_pages(page_count)}
+    content_types = set(page_types.values()) - {PAGE_EMPTY}
+    if not full_scan and len(content_types) <= 1 and len(page_types) < page_count:
+        logger.info(f"Classified {file_path} from {len(page_types)} sampled pages as "
+                    f"{content_types.pop() if content_types else PAGE_EMPTY}")
+        return PdfClassification(page_count, page_types, sampled=True)
+    
+    # The sample is mixed (or covers the whole file, or a full scan was asked for): classify every page
+    for number in range(page_count):
+        if number not in page_types:
+            page_types[number] = classify_page(pdf_reader.pages[number])
+    classification = PdfClassification(page_count, page_types, sampled=False)
+    logger.info(f"Classified {file_path}: {len(classification.pages_of_type(PAGE_TEXT))} text pages, "
+                f"{len(classification.pages_of_type(PAGE_IMAGE))} image pages")
+    return classification
+
 def is_image_based_pdf(file_path):
     """Check if a PDF is an image-based PDF that requires OCR processing."""
     try:
-        # Attempt to extract text using pdfminer
-        text = extract_text(file_path)
-        if text.strip():
-            return False  # Native PDF with extractable text
-        else:
-            return True  # Image-based PDF (no extractable text)
-    except PDFSyntaxError:
+        return classify_pdf(file_path).is_image_based
+    except PdfReadError:
         return True  # Likely an image-based PDF
 
-def process_native_pdf(file_path):
-    """Process a native PDF with extractable text and convert to markdown."""
+def _extract_page_range(file_path, page_numbers):
+    """Extract the text of some pages; runs in a worker process with its own reader."""
+    with open(file_path, "rb") as pdf_file:
+        pdf_reader = PyPDF2.PdfReader(pdf_file)
+        return [(i, pdf_reader.pages[i].extract_text()) for i in page_numbers]
+
+@lru_cache(maxsize=None)
+def get_pdf_process_pool():
+    """Return the process pool used to extract text from large PDFs.
+    
+    Workers are spawned rather than forked, since the app process runs
+    threads, and the pool is kept for the life of the process.
+    """
+    return ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+
+def extract_page_texts(file_path, page_numbers, pdf_reader=None) -> Dict[int, str]:
+    """Extract the text of the given 0-based pages, keyed by page number.
+    
+    Large PDFs are split into page ranges extracted in parallel by worker
+    processes that each open the file; small ones are extracted in-process.
+    """
+    page_numbers = list(page_numbers)
+    if len(page_numbers) >= PDF_PARALLEL_MIN_PAGES and PDF_EXTRACT_WORKERS > 1:
+        # A few ranges per worker keeps workers busy when some pages are slower
+        range_count = min(len(page_numbers), PDF_EXTRACT_WORKERS * 2)
+        size = -(-len(page_numbers) // range_count)
+        ranges = [page_numbers[i:i + size] for i in range(0, len(page_numbers), size)]
+        pool = None
+        try:
+            pool = get_pdf_process_pool()
+            texts = {}
+            for range_texts in pool.map(_extract_page_range, [file_path] * len(ranges), ranges):
+                texts.update(range_texts)
+            logger.info(f"Extracted {len(page_numbers)} pages in {len(ranges)} ranges across {PDF_EXTRACT_WORKERS} processes")
+            return texts
+        except Exception as e:
+            logger.warning(f"Parallel page extraction failed, extracting in-process: {e}")
+            # A broken pool stays broken; start a new one for the next PDF
+            get_pdf_process_pool.cache_clear()
+            if pool is not None:
+                pool.shutdown(wait=False, cancel_futures=True)
+    
+    if pdf_reader is None:
+        return dict(_extract_page_range(file_path, page_numbers))
+    return {i: pdf_reader.pages[i].extract_text() for i in page_numbers}
+
+def process_native_pdf(file_path, classification: PdfClassification = None, require_text=False):
+    """Process a native PDF with extractable text and convert to markdown.
+    
+    Pages already classified as image pages are skipped. Pages classified as
+    empty are still extracted, since the classification is only a heuristic.
+    If require_text is True, a ValueError is raised when no page has text.
+    """
     logger.info(f"Processing native PDF: {file_path}")
+    page_types = classification.page_types if classification else {}
     
     try:
         # Extract text from native PDF
         with open(file_path, "rb") as pdf_file:
             pdf_reader = PyPDF2.PdfReader(pdf_file)
-            pages = []
+            page_numbers = [i for i in range(len(pdf_reader.pages)) if page_types.get(i) != PAGE_IMAGE]
+            page_texts = extract_page_texts(file_path, page_numbers, pdf_reader)
             
-            for i, page in enumerate(pdf_reader.pages):
-                page_text = page.extract_text()
+            pages = []
+            for i in page_numbers:
+                page_text = page_texts[i]
                 if page_text.strip():
                     pages.append(f"## Page {i+1}\n{page_text}")
             
             full_text = "\n\n".join(pages)
+            if require_text and not pages:
+                raise ValueError("No extractable text found; Document Intelligence credentials required for image-based PDFs")
         
         # Create a temporary markdown file
         temp_md_path = os.path.join(tempfile.gettempdir(), f"{Path(file_path).stem}.md")
@@ -65,8 +255,133 @@ def process_native_pdf(file_path):
         logger.error(f"Error processing native PDF: {e}")
         raise
 
+def analyze_pdf_pages(content, endpoint, key):
+    """Run Document Intelligence layout analysis on PDF bytes.
+    
+    Returns:
+        A dict mapping 1-based page numbers (within content) to page text
+    """
+    # Get the shared Document Intelligence client
+    document_intelligence_client = get_document_intelligence_client(endpoint, key)
+    
+    # Process the document
+    poller = document_intelligence_client.begin_analyze_document(
+        OCR_MODEL,
+        AnalyzeDocumentRequest(url_source=None, bytes_source=content),
+        output_content_format=DocumentContentFormat.MARKDOWN, 
+    )
+    result: AnalyzeResult = poller.result()
+    
+    return {
+        page.page_number: "".join(f"{line.content}\n\n" for line in page.lines)
+        for page in result.pages
+    }
+
+def write_markdown(file_path, markdown_content, connection_string=None, container_name=None):
+    """Write converted markdown to a temporary file, optionally uploading it to blob storage."""
+    # Create a temporary markdown file
+    temp_md_path = os.path.join(tempfile.gettempdir(), f"{Path(file_path).stem}.md")
+    with open(temp_md_path, "w", encoding="utf-8") as file:
+        file.write(markdown_content)
+    
+    # Optionally upload to blob storage if credentials provided
+    if connection_string and container_name:
+        try:
+            # Initialize the Blob Service client
+            blob_service_client = BlobServiceClient.from_connection_string(connection_string)
+            blob_name = f"{Path(file_path).stem}.md"
+            blob_client = blob_service_client.get_blob_client(container=container_name, blob=blob_name)
+
+            # Upload the markdown file to Blob Storage
+            with open(temp_md_path, "rb") as data:
+                blob_client.upload_blob(data, overwrite=True)
+            logger.info(f"Uploaded markdown to blob: {blob_name}")
+        except Exception as e:
+            logger.warning(f"Failed to upload to blob storage: {e}")
+    
+    logger.info(f"Created markdown file: {temp_md_path}")
+    return temp_md_path
+
+def _pages_to_pdf(pdf_reader, page_numbers) -> bytes:
+    """Build a PDF containing only the given 0-based pages."""
+    writer = PyPDF2.PdfWriter()
+    for i in page_numbers:
+        writer.add_page(pdf_reader.pages[i])
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+def _is_retryable(error) -> bool:
+    if isinstance(error, (ServiceRequestError, ServiceResponseError)):
+        return True
+    status_code = getattr(error, "status_code", None)
+    return status_code in (408, 429) or (status_code or 0) >= 500
+
+def analyze_with_retry(content, endpoint, key, description="document"):
+    """Run analyze_pdf_pages, retrying transient failures with backoff."""
+    attempt = 0
+    while True:
+        try:
+            return analyze_pdf_pages(content, endpoint, key)
+        except Exception as e:
+            if attempt >= PDF_OCR_MAX_RETRIES or not _is_retryable(e):
+                raise
+            attempt += 1
+            delay = random.uniform(0, min(30.0, 2 ** attempt))
+            logger.warning(f"Analysis of {description} failed ({e}); retry {attempt}/{PDF_OCR_MAX_RETRIES} in {delay:.1f}s")
+            time.sleep(delay)
+
+def ocr_pages(content, page_numbers, endpoint, key, pdf_reader) -> Dict[int, str]:
+    """OCR some pages of a PDF with Document Intelligence.
+    
+    Long page lists are split into ranges of PDF_OCR_RANGE_PAGES pages that
+    are analyzed concurrently, with at most PDF_OCR_MAX_CONCURRENCY requests
+    in flight, so a large scan takes about as long as its slowest range.
+    
+    Args:
+        content: The bytes of the whole PDF, sent as-is when every page is
+            wanted in one range (optional)
+        page_numbers: 0-based numbers of the pages to OCR
+        endpoint: Document Intelligence endpoint
+        key: Document Intelligence key
+        pdf_reader: A PdfReader over content
+    
+    Returns:
+        A dict mapping 0-based page numbers to page text
+    """
+    page_numbers = list(page_numbers)
+    ranges = [page_numbers[i:i + PDF_OCR_RANGE_PAGES] for i in range(0, len(page_numbers), PDF_OCR_RANGE_PAGES)]
+    
+    def analyze_range(page_range, range_content):
+        description = f"pages {page_range[0] + 1}-{page_range[-1] + 1}"
+        # Map page numbers within the range back to page numbers in the original PDF
+        return {page_range[number - 1]: text
+                for number, text in analyze_with_retry(range_content, endpoint, key, description).items()}
+    
+    if len(ranges) <= 1:
+        if not ranges:
+            return {}
+        # Send the original file when it is exactly the pages wanted
+        whole_file = content is not None and ranges[0] == list(range(len(pdf_reader.pages)))
+        return analyze_range(ranges[0], content if whole_file else _pages_to_pdf(pdf_reader, ranges[0]))
+    
+    # Sub-PDFs are built up front because PdfReader is not safe to share between threads
+    payloads = [(page_range, _pages_to_pdf(pdf_reader, page_range)) for page_range in ranges]
+    logger.info(f"Analyzing {len(page_numbers)} pages in {len(ranges)} ranges, "
+                f"{PDF_OCR_MAX_CONCURRENCY} at a time")
+    
+    page_texts = {}
+    with ThreadPoolExecutor(max_workers=PDF_OCR_MAX_CONCURRENCY, thread_name_prefix="ocr") as executor:
+        futures = [executor.submit(analyze_range, page_range, range_content) for page_range, range_content in payloads]
+        for future in futures:
+            page_texts.update(future.result())
+    return page_texts
+
 def process_image_pdf(file_path, endpoint, key, connection_string=None, container_name=None):
-    """Process an image-based PDF using Azure Document Intelligence."""
+    """Process an image-based PDF using Azure Document Intelligence.
+    
+    Long scans are analyzed as concurrent page ranges (see ocr_pages).
+    """
     logger.info(f"Processing image-based PDF: {file_path}")
     
     try:
@@ -74,73 +389,136 @@ def process_image_pdf(file_path, endpoint, key, connection_string=None, containe
         with open(file_path, 'rb') as file:
             content = file.read()
 
-        # Initialize Document Intelligence client
-        document_intelligence_client = DocumentIntelligenceClient(
-            endpoint=endpoint, 
-            credential=AzureKeyCredential(key)
-        )
-        
-        # Process the document
-        poller = document_intelligence_client.begin_analyze_document(
-            "prebuilt-layout",
-            AnalyzeDocumentRequest(url_source=None, bytes_source=content),
-            output_content_format=DocumentContentFormat.MARKDOWN, 
-        )
-        result: AnalyzeResult = poller.result()
+        try:
+            pdf_reader = PyPDF2.PdfReader(io.BytesIO(content))
+            page_count = len(pdf_reader.pages)
+        except PdfReadError as e:
+            # Document Intelligence may still read a file PyPDF2 cannot parse
+            logger.warning(f"Could not split PDF into pages ({e}), analyzing it whole")
+            pdf_reader = None
+
+        if pdf_reader is None:
+            page_texts = analyze_with_retry(content, endpoint, key)
+        else:
+            page_texts = {number + 1: text
+                          for number, text in ocr_pages(content, range(page_count), endpoint, key, pdf_reader).items()}
 
         # Extract and format the information into markdown
         markdown_content = "# Converted from PDF To Markdown\n\n"
+        for page_number in sorted(page_texts):
+            markdown_content += f"## Page {page_number}\n{page_texts[page_number]}"
 
-        for page in result.pages:
-            markdown_content += f"## Page {page.page_number}\n"
-            for line in page.lines:
-                markdown_content += f"{line.content}\n\n"
-
-        # Create a temporary markdown file
-        temp_md_path = os.path.join(tempfile.gettempdir(), f"{Path(file_path).stem}.md")
-        with open(temp_md_path, "w", encoding="utf-8") as file:
-            file.write(markdown_content)
-        
-        # Optionally upload to blob storage if credentials provided
-        if connection_string and container_name:
-            try:
-                # Initialize the Blob Service client
-                blob_service_client = BlobServiceClient.from_connection_string(connection_string)
-                blob_name = f"{Path(file_path).stem}.md"
-                blob_client = blob_service_client.get_blob_client(container=container_name, blob=blob_name)
-
-                # Upload the markdown file to Blob Storage
-                with open(temp_md_path, "rb") as data:
-                    blob_client.upload_blob(data, overwrite=True)
-                logger.info(f"Uploaded markdown to blob: {blob_name}")
-            except Exception as e:
-                logger.warning(f"Failed to upload to blob storage: {e}")
-        
-        logger.info(f"Created markdown file: {temp_md_path}")
-        return temp_md_path
+        return write_markdown(file_path, markdown_content, connection_string, container_name)
         
     except Exception as e:
         logger.error(f"Error processing image-based PDF: {e}")
         raise
 
+def process_hybrid_pdf(file_path, classification, endpoint, key, connection_string=None, container_name=None):
+    """Process a PDF with both native and scanned pages.
+    
+    Text is extracted locally from the native pages, and only the scanned
+    pages are sent to Document Intelligence, as a PDF of just those pages.
+    The results are merged back in page order.
+    """
+    image_pages = classification.pages_of_type(PAGE_IMAGE)
+    logger.info(f"Processing mixed PDF: {file_path} ({len(image_pages)} of {classification.page_count} pages scanned)")
+    
+    try:
+        page_texts = {}
+        with open(file_path, "rb") as pdf_file:
+            pdf_reader = PyPDF2.PdfReader(pdf_file)
+            
+            # Extract the native pages locally (including pages classified as empty)
+            native_pages = [i for i in range(classification.page_count) if i not in image_pages]
+            for i, text in extract_page_texts(file_path, native_pages, pdf_reader).items():
+                page_texts[i + 1] = text
+            
+            # OCR only the scanned pages, sent as PDFs of just those pages
+            for i, text in ocr_pages(None, image_pages, endpoint, key, pdf_reader).items():
+                page_texts[i + 1] = text
+        
+        pages = [f"## Page {number}\n{text}" for number, text in sorted(page_texts.items()) if text.strip()]
+        markdown_content = "# Converted PDF Document\n\n" + "\n\n".join(pages)
+        return write_markdown(file_path, markdown_content, connection_string, container_name)
+    
+    except Exception as e:
+        logger.error(f"Error processing mixed PDF: {e}")
+        raise
+
 def process_pdf(file_path, endpoint=None, key=None, connection_string=None, container_name=None):
-    """Process a PDF document, determining if it needs OCR or not."""
+    """Process a PDF document, determining if it needs OCR or not.
+    
+    PDFs that mix native and scanned pages only have their scanned pages OCRed.
+    The converted markdown is cached by file content, so re-uploading a PDF
+    skips parsing and OCR.
+    """
     if not os.path.exists(file_path):
         raise FileNotFoundError(f"PDF file not found: {file_path}")
     
-    # Check if this is an image-based PDF that needs OCR
-    if is_image_based_pdf(file_path):
+    # Look up the markdown of an identical file converted the same way
+    cache = get_pdf_cache()
+    digest = None
+    if cache is not None:
+        # Conversions with and without OCR credentials give different output
+        converter = f"{PDF_CONVERTER_ID}:ocr={bool(endpoint and key)}:hybrid={PDF_HYBRID_OCR}"
+        try:
+            digest = file_hash(file_path)
+            markdown_content = cache.get(digest, converter)
+        except Exception as e:
+            logger.warning(f"PDF cache lookup failed: {e}")
+            markdown_content = None
+        if markdown_content is not None:
+            logger.info(f"Using cached conversion of {file_path}")
+            return write_markdown(file_path, markdown_content, connection_string, container_name)
+    
+    markdown_path = convert_pdf(file_path, endpoint, key, connection_string, container_name)
+    
+    if cache is not None and digest is not None:
+        try:
+            with open(markdown_path, "r", encoding="utf-8") as md_file:
+                cache.put(digest, converter, md_file.read())
+        except Exception as e:
+            logger.warning(f"PDF cache write failed: {e}")
+    return markdown_path
+
+def convert_pdf(file_path, endpoint=None, key=None, connection_string=None, container_name=None):
+    """Convert a PDF to markdown, with OCR for scanned pages, bypassing the cache."""
+    # Check if this is an image-based PDF that needs OCR. When scanned pages can be
+    # OCRed individually every page is classified; otherwise a sample of pages is enough.
+    # The app normally has credentials and PDF_HYBRID_OCR on, so it always does the
+    # full scan; the sampling shortcut applies without OCR or with hybrid OCR off
+    hybrid_ocr = PDF_HYBRID_OCR and bool(endpoint and key)
+    try:
+        classification = classify_pdf(file_path, full_scan=hybrid_ocr)
+    except PdfReadError as e:
+        logger.warning(f"Could not parse PDF structure ({e}), treating it as image-based")
+        classification = None
+    
+    if classification is None or classification.is_image_based:
         logger.info(f"Detected image-based PDF: {file_path}")
         
         if not endpoint or not key:
-            raise ValueError("Document Intelligence credentials required for image-based PDFs")
+            if classification is None:
+                raise ValueError("Document Intelligence credentials required for image-based PDFs")
+            # Without OCR, a page sample that missed the text (or a misjudged page)
+            # would fail the upload; extract whatever text the pages have instead
+            logger.info(f"No OCR credentials, extracting any text from every page of {file_path}")
+            return process_native_pdf(file_path, require_text=True)
             
         # Process with Document Intelligence for OCR
         return process_image_pdf(
             file_path, endpoint, key, connection_string, container_name
         )
+    elif classification.is_mixed and hybrid_ocr:
+        logger.info(f"Detected PDF with native and scanned pages: {file_path}")
+        
+        # OCR only the scanned pages
+        return process_hybrid_pdf(
+            file_path, classification, endpoint, key, connection_string, container_name
+        )
     else:
         logger.info(f"Detected native PDF with extractable text: {file_path}")
         
         # Process native PDF by extracting text
-        return process_native_pdf(file_path)
+        return process_native_pdf(file_path, classification)
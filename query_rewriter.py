@@ -0,0 +1,184 @@
+"""
+Conversational Query Rewriting
+
+This module turns a follow-up question (e.g. "and the renewal?") into a
+standalone search query using the recent conversation, with the prompt defined
+in intent_mapping.prompty. The prompty file is loaded and compiled once per
+process, rewrites run on a small deployment under a strict time budget, and
+results are cached by the conversation tail and question. If the rewrite is
+slow or fails, the original question is used unchanged.
+"""
+
+import os
+import re
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from functools import lru_cache
+from typing import Callable, Dict, List, Tuple
+
+from config import get_logger
+from clients import get_model_executor, get_rewrite_model
+
+logger = get_logger(__name__)
+
+# Query rewriting settings
+QUERY_REWRITE_ENABLED = os.getenv("QUERY_REWRITE_ENABLED", "false").lower() == "true"
+QUERY_REWRITE_TIMEOUT_SECONDS = float(os.getenv("QUERY_REWRITE_TIMEOUT_SECONDS", "1.5"))
+# Number of previous question/answer turns given to the rewrite prompt
+QUERY_REWRITE_HISTORY_TURNS = int(os.getenv("QUERY_REWRITE_HISTORY_TURNS", "3"))
+QUERY_REWRITE_CACHE_SIZE = int(os.getenv("QUERY_REWRITE_CACHE_SIZE", "512"))
+# Previous answers are truncated to keep the rewrite prompt small
+_MAX_ANSWER_CHARS = 500
+
+PROMPTY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "intent_mapping.prompty")
+
+_ROLE_LINE = re.compile(r"^(system|user|assistant):\s*$", re.MULTILINE)
+_SECTION = re.compile(r"\{\{#(\w+)\}\}(.*?)\{\{/\1\}\}", re.DOTALL)
+_VARIABLE = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+
+def _compile_template(template: str) -> Callable[[Dict], str]:
+    """Compile the mustache subset used by prompty files (variables and list sections)."""
+    parts = []
+    position = 0
+    for match in _SECTION.finditer(template):
+        parts.append(("text", template[position:match.start()]))
+        # Like mustache, a section tag on its own line does not add a line break
+        body = match.group(2)
+        parts.append(("section", match.group(1), body[1:] if body.startswith("\n") else body))
+        position = match.end()
+    parts.append(("text", template[position:]))
+
+    def substitute(text: str, values: Dict) -> str:
+        return _VARIABLE.sub(lambda m: str(values.get(m.group(1), "")), text)
+
+    def render(inputs: Dict) -> str:
+        output = []
+        for part in parts:
+            if part[0] == "text":
+                output.append(substitute(part[1], inputs))
+            else:
+                output.extend(substitute(part[2], item) for item in inputs.get(part[1]) or [])
+        return "".join(output)
+
+    return render
+
+
+@lru_cache(maxsize=None)
+def load_prompty(path: str = PROMPTY_PATH) -> List[Tuple[str, Callable[[Dict], str]]]:
+    """Load a prompty file and compile it into (role, render function) messages."""
+    with open(path, "r", encoding="utf-8") as f:
+        text = f.read()
+
+    # Drop the YAML front matter; the deployment is configured by the clients module
+    if text.startswith("---"):
+        text = text.split("---", 2)[2]
+
+    messages = []
+    matches = list(_ROLE_LINE.finditer(text))
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        messages.append((match.group(1), _compile_template(text[match.end():end].strip())))
+    logger.info(f"Compiled prompty {os.path.basename(path)} with {len(messages)} messages")
+    return messages
+
+
+def parse_rewrite(content: str) -> str:
+    """Extract the search query from the model's (JSON) response."""
+    content = content.strip()
+    # Models sometimes wrap JSON in a markdown code fence
+    content = re.sub(r"^```(?:json)?\s*|\s*```$", "", content)
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return content.strip('"')
+    if isinstance(data, str):
+        return data
+    if isinstance(data, dict):
+        for key in ("search_query", "query", "searchQuery"):
+            if isinstance(data.get(key), str):
+                return data[key]
+        values = [value for value in data.values() if isinstance(value, str)]
+        if values:
+            return values[0]
+    return ""
+
+
+class QueryRewriter:
+    """Rewrites follow-up questions into standalone search queries, with an LRU cache."""
+
+    def __init__(self, cache_size: int = QUERY_REWRITE_CACHE_SIZE, timeout: float = QUERY_REWRITE_TIMEOUT_SECONDS,
+                 history_turns: int = QUERY_REWRITE_HISTORY_TURNS):
+        self.cache_size = cache_size
+        self.timeout = timeout
+        self.history_turns = history_turns
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _conversation(self, question: str, history: List[dict]) -> List[dict]:
+        conversation = []
+        for turn in history[-self.history_turns:]:
+            conversation.append({"role": "user", "content": turn["question"]})
+            conversation.append({"role": "assistant", "content": turn["answer"][:_MAX_ANSWER_CHARS]})
+        conversation.append({"role": "user", "content": question})
+        return conversation
+
+    def _generate(self, conversation: List[dict]) -> str:
+        messages = [(role, render({"conversation": conversation})) for role, render in load_prompty()]
+        return parse_rewrite(get_rewrite_model().invoke(messages).content)
+
+    def rewrite(self, question: str, history: List[dict]) -> str:
+        """Return a standalone search query for a question, or the question itself.
+
+        Args:
+            question: The current user question
+            history: Previous turns, as conversation_history entries with
+                "question" and "answer"
+        """
+        # A first question has no context to resolve
+        if not history:
+            return question
+
+        conversation = self._conversation(question, history)
+        key = tuple((turn["role"], turn["content"]) for turn in conversation)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        future = get_model_executor().submit(self._generate, conversation)
+        try:
+            rewritten = future.result(timeout=self.timeout).strip()
+        except FutureTimeoutError:
+            future.cancel()
+            logger.warning(f"Query rewrite exceeded {self.timeout}s, using the original question")
+            return question
+        except Exception as e:
+            logger.warning(f"Query rewrite failed, using the original question: {e}")
+            return question
+
+        if not rewritten:
+            return question
+        logger.info(f"Rewrote question '{question}' as '{rewritten}'")
+        with self._lock:
+            self._cache[key] = rewritten
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return rewritten
+
+
+_rewriter = None
+_rewriter_lock = threading.Lock()
+
+
+def rewrite_query(question: str, history: List[dict]) -> str:
+    """Rewrite a question using the conversation, if query rewriting is enabled."""
+    global _rewriter
+    if not QUERY_REWRITE_ENABLED:
+        return question
+    with _rewriter_lock:
+        if _rewriter is None:
+            _rewriter = QueryRewriter()
+    return _rewriter.rewrite(question, history)
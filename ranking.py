@@ -0,0 +1,86 @@
+"""
+Result Ranking
+
+This module merges search results returned by several Azure AI Search indices
+into one globally ranked top-k list. Each index's keyword and vector results
+are first fused with reciprocal rank fusion, whose scores depend only on
+ranks and so are comparable across indices. The fused lists are then merged
+on those scores, or with reciprocal rank fusion over each index's ranks.
+"""
+
+import os
+import heapq
+from typing import Dict, List
+
+from config import get_logger
+
+logger = get_logger(__name__)
+
+# "score" merges on relevance scores, "rrf" uses reciprocal rank fusion
+SEARCH_MERGE_METHOD = os.getenv("SEARCH_MERGE_METHOD", "score").lower()
+# Standard RRF smoothing constant (also used by Azure AI Search hybrid ranking)
+RRF_K = 60
+
+
+def merge_by_score(result_lists: List[List[dict]], top_k: int) -> List[dict]:
+    """Return the global top-k results by relevance score.
+
+    Scores are compared as they are, so they must be comparable across
+    indices, such as the RRF scores set by fuse_legs. Raw BM25 or hybrid
+    scores are not: they depend on the statistics of each index.
+    """
+    candidates = [doc for results in result_lists for doc in results]
+    for doc in candidates:
+        doc["merged_score"] = doc.get("score") or 0.0
+    return heapq.nlargest(top_k, candidates, key=lambda doc: doc["merged_score"])
+
+
+def merge_by_rrf(result_lists: List[List[dict]], top_k: int, k: int = RRF_K) -> List[dict]:
+    """Return the global top-k results using reciprocal rank fusion.
+
+    A result found by several lists (e.g. the same chunk returned twice) has
+    its contributions summed.
+    """
+    fused: Dict[str, float] = {}
+    docs: Dict[str, dict] = {}
+    for results in result_lists:
+        for rank, doc in enumerate(results, start=1):
+            key = f"{doc.get('index_name', '')}/{doc['id']}"
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+            docs.setdefault(key, doc)
+
+    for key, doc in docs.items():
+        doc["merged_score"] = fused[key]
+    return heapq.nlargest(top_k, docs.values(), key=lambda doc: doc["merged_score"])
+
+
+def fuse_legs(result_lists: List[List[dict]], top_k: int) -> List[dict]:
+    """Fuse the keyword and vector results of one index with reciprocal rank fusion.
+
+    As in an Azure AI Search hybrid query, the fused value becomes each
+    result's "score", so the fused lists of several indices can be passed to
+    merge_results.
+    """
+    fused = merge_by_rrf(result_lists, top_k)
+    for doc in fused:
+        doc["score"] = doc["merged_score"]
+    return fused
+
+
+def merge_results(result_lists: List[List[dict]], top_k: int, method: str = None) -> List[dict]:
+    """Merge per-index result lists into a single top-k list.
+
+    Args:
+        result_lists: One ranked list of results per index
+        top_k: Number of results to return
+        method: "score" or "rrf" (defaults to SEARCH_MERGE_METHOD)
+
+    Returns:
+        Up to top_k results, best first, each with a "merged_score"
+    """
+    method = (method or SEARCH_MERGE_METHOD).lower()
+    if method == "rrf":
+        return merge_by_rrf(result_lists, top_k)
+    if method != "score":
+        logger.warning(f"Unknown merge method '{method}', merging by score")
+    return merge_by_score(result_lists, top_k)
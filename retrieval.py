@@ -0,0 +1,116 @@
+"""
+Search Retrieval
+
+This module runs the queries behind a question against Azure AI Search:
+a hybrid, keyword-only or vector-only query per index that fetches only ids
+and scores, and a narrow follow-up query per index that loads the content of
+the final results. It does not use Streamlit state, so its functions can run
+on worker threads and from the async ask pipeline.
+"""
+
+import os
+from typing import Dict, List
+
+from clients import get_search_client
+from config import get_logger
+from create_index_from_file import SHARED_INDEX_MODE
+
+logger = get_logger(__name__)
+
+# Indices that have not answered within this time are left out of the results
+SEARCH_TIMEOUT_SECONDS = float(os.getenv("SEARCH_TIMEOUT_SECONDS", "5"))
+
+
+def build_document_filter(doc_ids: List[str], session_id: str = None) -> str:
+    """Build an OData filter restricting a search to the given documents (and session)."""
+    escaped_ids = ",".join(doc_id.replace("'", "''") for doc_id in doc_ids)
+    document_filter = f"search.in(doc_id, '{escaped_ids}', ',')"
+    if SHARED_INDEX_MODE and session_id:
+        escaped_session = session_id.replace("'", "''")
+        document_filter += f" and session_id eq '{escaped_session}'"
+    return document_filter
+
+
+def search_index(index_name: str, doc_ids: List[str], question: str, vector_query, session_id: str = None,
+                 top: int = 5) -> List[dict]:
+    """Run a search on one index, restricted to the given documents.
+
+    The search is hybrid when both question and vector_query are given, and
+    keyword-only or vector-only when one of them is None. Only ids and scores
+    are fetched; content is loaded later for the final results with
+    fetch_chunks. This runs on a worker thread, so it must not touch
+    st.session_state.
+    """
+    logger.info(f"Searching index {index_name} for documents {doc_ids}")
+
+    # Create a search client for this index
+    search_client = get_search_client(index_name)
+
+    # Perform the search on this index, restricted to the selected documents
+    search_results = search_client.search(
+        search_text=question,
+        vector_queries=[vector_query] if vector_query is not None else None,
+        filter=build_document_filter(doc_ids, session_id),
+        # Apply the filter before the vector search so k neighbours come from the selected documents
+        vector_filter_mode="preFilter" if vector_query is not None else None,
+        select=["id", "doc_id"],
+        top=top
+    )
+
+    # Format the results for this index
+    documents = [
+        {
+            "id": result["id"],
+            "doc_id": result.get("doc_id", ""),
+            "index_name": index_name,  # Add the index name for reference
+            "score": result.get("@search.score")
+        }
+        for result in search_results
+    ]
+
+    logger.info(f"Search found {len(documents)} matching chunks in index {index_name}")
+    return documents
+
+
+def fetch_chunks(index_name: str, chunk_ids: List[str]) -> Dict[str, dict]:
+    """Fetch the content fields of specific chunks from one index, keyed by id."""
+    escaped_ids = ",".join(chunk_id.replace("'", "''") for chunk_id in chunk_ids)
+    search_results = get_search_client(index_name).search(
+        search_text="*",
+        filter=f"search.in(id, '{escaped_ids}', ',')",
+        select=["id", "content", "filepath", "title", "url", "token_count"],
+        top=len(chunk_ids)
+    )
+    return {result["id"]: result for result in search_results}
+
+
+def group_ids_by_index(results: List[dict]) -> Dict[str, List[str]]:
+    """Group result chunk ids by the index they came from."""
+    ids_by_index = {}
+    for doc in results:
+        ids_by_index.setdefault(doc["index_name"], []).append(doc["id"])
+    return ids_by_index
+
+
+def attach_content(results: List[dict], chunks: Dict[tuple, dict]) -> List[dict]:
+    """Add the fetched content to each result, dropping results whose content is missing.
+
+    Args:
+        results: Search results with "index_name" and "id"
+        chunks: Fetched chunks keyed by (index_name, id)
+    """
+    hydrated = []
+    for doc in results:
+        chunk = chunks.get((doc["index_name"], doc["id"]))
+        if chunk is None:
+            continue
+        doc.update({
+            "content": chunk["content"],
+            "filepath": chunk.get("filepath", "Unknown"),
+            "title": chunk.get("title", "Untitled"),
+            "url": chunk.get("url", ""),
+            "token_count": chunk.get("token_count"),
+        })
+        hydrated.append(doc)
+    return hydrated
+
@@ -0,0 +1,182 @@
+"""
+Azure AI Search Batch Uploader
+
+This module uploads documents to an Azure AI Search index in batches that
+respect the service limits (1000 actions and ~16 MB per request). Batches are
+sent concurrently from a bounded worker pool, and the per-document
+IndexingResult of every batch is inspected so that only the documents that
+failed with a transient status are retried.
+"""
+
+import os
+import json
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from azure.core.exceptions import ServiceRequestError, ServiceResponseError
+from config import get_logger
+
+logger = get_logger(__name__)
+
+# Azure AI Search accepts at most 1000 actions per indexing request
+UPLOAD_MAX_ACTIONS = int(os.getenv("UPLOAD_MAX_ACTIONS", "1000"))
+# Stay comfortably below the 16 MB request size limit
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(12 * 1024 * 1024)))
+UPLOAD_MAX_WORKERS = int(os.getenv("UPLOAD_MAX_WORKERS", "4"))
+UPLOAD_MAX_RETRIES = int(os.getenv("UPLOAD_MAX_RETRIES", "3"))
+
+# Per-document status codes worth retrying (see the Azure AI Search indexing docs)
+RETRYABLE_STATUS_CODES = {409, 422, 429, 503}
+
+# Client methods for each indexing action
+_ACTIONS = {
+    "upload": "upload_documents",
+    "merge": "merge_documents",
+    "merge_or_upload": "merge_or_upload_documents",
+    "delete": "delete_documents",
+}
+
+
+def split_batches(docs: List[dict], max_actions: int = None, max_bytes: int = None) -> List[List[dict]]:
+    """Split documents into batches bounded by action count and payload size."""
+    max_actions = max_actions or UPLOAD_MAX_ACTIONS
+    max_bytes = max_bytes or UPLOAD_MAX_BYTES
+
+    batches = []
+    current = []
+    current_bytes = 0
+    for doc in docs:
+        size = len(json.dumps(doc, default=str))
+        if current and (len(current) >= max_actions or current_bytes + size > max_bytes):
+            batches.append(current)
+            current = []
+            current_bytes = 0
+        current.append(doc)
+        current_bytes += size
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+class SearchUploader:
+    """Concurrent, size-aware uploader for a single search index.
+
+    Use add() to queue documents (it returns as soon as the batches are
+    submitted) and flush() to wait for every batch to finish. flush() raises
+    if any document could not be indexed after retries.
+    """
+
+    def __init__(self, search_client, action: str = "upload", max_actions: int = None, max_bytes: int = None,
+                 max_workers: int = None, max_retries: int = None, key_field: str = "id"):
+        if action not in _ACTIONS:
+            raise ValueError(f"Unsupported indexing action: {action}")
+        self.search_client = search_client
+        self.action = action
+        self.max_actions = max_actions or UPLOAD_MAX_ACTIONS
+        self.max_bytes = max_bytes or UPLOAD_MAX_BYTES
+        self.max_retries = UPLOAD_MAX_RETRIES if max_retries is None else max_retries
+        self.key_field = key_field
+
+        max_workers = max_workers or UPLOAD_MAX_WORKERS
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="upload")
+        # Bound the number of batches held in memory waiting for a worker
+        self._slots = threading.BoundedSemaphore(max_workers * 2)
+        self._futures = []
+        self._lock = threading.Lock()
+        self.succeeded = 0
+        self.failed: Dict[str, str] = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        return False
+
+    def add(self, docs: List[dict]):
+        """Split documents into batches and submit them for upload."""
+        for batch in split_batches(docs, self.max_actions, self.max_bytes):
+            self._slots.acquire()
+            future = self._executor.submit(self._send, batch)
+            future.add_done_callback(lambda _: self._slots.release())
+            self._futures.append(future)
+
+    def upload_all(self, docs: List[dict]) -> int:
+        """Upload documents and wait for completion, returning the number indexed."""
+        self.add(docs)
+        return self.flush()
+
+    def flush(self) -> int:
+        """Wait for all submitted batches and return the number of indexed documents."""
+        futures, self._futures = self._futures, []
+        errors = []
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                errors.append(e)
+        self._executor.shutdown(wait=True)
+
+        if errors:
+            raise errors[0]
+        if self.failed:
+            sample = "; ".join(f"{key}: {message}" for key, message in list(self.failed.items())[:5])
+            raise RuntimeError(f"Failed to index {len(self.failed)} documents: {sample}")
+        return self.succeeded
+
+    def _send(self, batch: List[dict]):
+        """Send one batch, retrying only the documents that failed transiently."""
+        send = getattr(self.search_client, _ACTIONS[self.action])
+        pending = batch
+        attempt = 0
+        while pending:
+            try:
+                results = send(pending)
+            except Exception as e:
+                status_code = getattr(e, "status_code", None)
+                if status_code == 413 and len(pending) > 1:
+                    # Payload still too large: split the batch and send the halves
+                    middle = len(pending) // 2
+                    logger.warning(f"Indexing request too large, splitting batch of {len(pending)}")
+                    self._send(pending[:middle])
+                    self._send(pending[middle:])
+                    return
+                retryable = (status_code in RETRYABLE_STATUS_CODES or (status_code or 0) >= 500
+                             or isinstance(e, (ServiceRequestError, ServiceResponseError)))
+                if attempt >= self.max_retries or not retryable:
+                    raise
+                attempt += 1
+                self._backoff(attempt, f"indexing request failed ({e})")
+                continue
+
+            by_key = {str(doc[self.key_field]): doc for doc in pending}
+            retry = []
+            succeeded = 0
+            for result in results:
+                if result.succeeded:
+                    succeeded += 1
+                elif result.status_code in RETRYABLE_STATUS_CODES and attempt < self.max_retries:
+                    retry.append(by_key[result.key])
+                else:
+                    with self._lock:
+                        self.failed[result.key] = result.error_message or f"status {result.status_code}"
+
+            with self._lock:
+                self.succeeded += succeeded
+
+            pending = retry
+            if pending:
+                attempt += 1
+                self._backoff(attempt, f"{len(pending)} documents failed transiently")
+
+    def _backoff(self, attempt: int, reason: str):
+        delay = random.uniform(0, min(30.0, 2 ** attempt))
+        logger.warning(f"{reason}; retry {attempt}/{self.max_retries} in {delay:.1f}s")
+        time.sleep(delay)
@@ -11,6 +11,8 @@ import uuid
 from typing import Dict, List, Set, Tuple, Optional
 from azure.search.documents.indexes import SearchIndexClient
 from config import get_logger
+from clients import release_search_client
+from create_index_from_file import delete_document_chunks, is_shared_index
 
 logger = get_logger(__name__)
 
@@ -102,7 +104,12 @@ def cleanup_session_resources(index_client: SearchIndexClient):
     # Delete each index
     for doc_id, index_name in indices_to_delete:
         try:
-            index_client.delete_index(index_name)
+            if is_shared_index(index_name):
+                # Other sessions' documents live in the shared index; only remove ours
+                delete_document_chunks(index_name, doc_id)
+            else:
+                index_client.delete_index(index_name)
+                release_search_client(index_name)
             logger.info(f"Cleaned up index {index_name} for document {doc_id}")
         except Exception as e:
             logger.error(f"Error cleaning up index {index_name}: {e}")
@@ -20,7 +20,8 @@ def install_requirements():
         "python-dotenv>=1.0.0",
         "pypdf2>=3.0.1",
         "pdfminer.six>=20221105",
-        "pandas>=2.0.0"
+        "pandas>=2.0.0",
+        "tiktoken>=0.5.0"
     ]
     
     for requirement in requirements:
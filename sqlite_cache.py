@@ -0,0 +1,107 @@
+"""
+SQLite LRU Cache Storage
+
+This module provides the storage shared by the on-disk caches (embeddings and
+converted PDF markdown): a SQLite table of entries with a size and a last-used
+time, bounded in total size, that evicts the least recently used entries
+first. Subclasses name the table, declare their value columns and implement
+their own get/put methods on top of it.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from typing import Callable, Iterable, Optional
+
+from config import get_logger
+
+logger = get_logger(__name__)
+
+
+class SqliteLruCache:
+    """SQLite table of cache entries bounded by the total size of their values."""
+
+    # Set by subclasses: the table name, the column definitions stored between
+    # "key" and "size", and the name used in log messages
+    table = None
+    value_columns = None
+    description = "cache"
+    # Number of rows removed per eviction query
+    eviction_batch = 256
+
+    def __init__(self, path: str, max_bytes: int):
+        """Open (or create) the cache database.
+
+        Args:
+            path: Location of the SQLite database file
+            max_bytes: Maximum total size of the stored values before eviction
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        # Streamlit serves sessions from several threads, so share one connection behind a lock
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {self.table} ("
+            f"key TEXT PRIMARY KEY, {self.value_columns}, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        # Eviction sums the sizes and scans the oldest entries; covering both with one index
+        # keeps those queries off the value pages (large BLOBs spill into overflow pages)
+        self._conn.execute(f"DROP INDEX IF EXISTS idx_{self.table}_last_used")
+        self._conn.execute(
+            f"CREATE INDEX IF NOT EXISTS idx_{self.table}_last_used_size ON {self.table} (last_used, size)"
+        )
+        self._conn.commit()
+
+    def _touch(self, keys: Iterable[str]):
+        """Mark entries as used now; the caller holds the lock."""
+        now = time.time()
+        self._conn.executemany(f"UPDATE {self.table} SET last_used = ? WHERE key = ?", [(now, key) for key in keys])
+        self._conn.commit()
+
+    def _evict(self):
+        """Remove least recently used entries until the cache fits in max_bytes; the caller holds the lock."""
+        total = self._conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {self.table}").fetchone()[0]
+        removed = 0
+        while total > self.max_bytes:
+            rows = self._conn.execute(
+                f"SELECT key, size FROM {self.table} ORDER BY last_used LIMIT ?", (self.eviction_batch,)
+            ).fetchall()
+            if not rows:
+                break
+            victims = []
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                victims.append((key,))
+                total -= size
+            self._conn.executemany(f"DELETE FROM {self.table} WHERE key = ?", victims)
+            removed += len(victims)
+        if removed:
+            self._conn.commit()
+            logger.info(f"Evicted {removed} entries from {self.description}")
+
+    def clear(self):
+        """Remove every entry from the cache."""
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+
+
+def open_cache(factory: Callable[[], SqliteLruCache], path: str) -> Optional[SqliteLruCache]:
+    """Open a cache, or return None (with a warning) if it cannot be opened."""
+    try:
+        cache = factory()
+        logger.info(f"Opened {cache.description} at {path}")
+        return cache
+    except Exception as e:
+        # The cache is an optimisation; never fail ingestion because of it
+        logger.warning(f"Cache at {path} unavailable, continuing without it: {e}")
+        return None
@@ -7,7 +7,9 @@ from pathlib import Path
 
 def test_processing():
     """Test document processing and write results to a file"""
-    from create_index_from_file import create_docs_from_word, create_docs_from_powerpoint, embeddings
+    from create_index_from_file import create_docs_from_word, create_docs_from_powerpoint
+    from clients import get_embeddings
+    embeddings = get_embeddings()
     
     # Paths to test files
     word_file = "sample_docs/Commercial_Office_Lease_Agreement.docx"
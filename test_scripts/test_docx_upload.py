@@ -11,7 +11,9 @@ logger = logging.getLogger(__name__)
 
 def test_word_upload():
     """Test Word document upload to index"""
-    from create_index_from_file import create_docs_from_word, embeddings
+    from create_index_from_file import create_docs_from_word
+    from clients import get_embeddings
+    embeddings = get_embeddings()
     
     # Path to test Word file
     docx_file = "sample_docs/Commercial_Office_Lease_Agreement.docx"
@@ -2,7 +2,9 @@
 Test script to validate PowerPoint processing
 """
 import logging
-from create_index_from_file import create_docs_from_powerpoint, embeddings
+from create_index_from_file import create_docs_from_powerpoint
+from clients import get_embeddings
+embeddings = get_embeddings()
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -0,0 +1,44 @@
+"""
+Test script for merging search results across indices
+This script checks the ranking module offline, with hand-made result lists
+"""
+
+import os
+import sys
+
+# Add the parent directory to sys.path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ranking import RRF_K, fuse_legs, merge_results
+
+
+def result(index_name, chunk_id):
+    return {"id": chunk_id, "doc_id": f"d{index_name}", "index_name": index_name}
+
+
+def test_multi_index_merge():
+    """A chunk found by both queries of one index outranks a weak hit from another index."""
+    # Index A: both chunks are found by the keyword and the vector query
+    index_a = fuse_legs([[result("A", "a1"), result("A", "a2")], [result("A", "a1"), result("A", "a2")]], top_k=2)
+    # Index B: one weak hit, found by the vector query only
+    index_b = fuse_legs([[], [result("B", "b1")]], top_k=2)
+
+    merged = merge_results([index_a, index_b], top_k=2, method="score")
+    print(f"Merged: {[(doc['id'], round(doc['merged_score'], 4)) for doc in merged]}")
+    assert [doc["id"] for doc in merged] == ["a1", "a2"], [doc["id"] for doc in merged]
+
+
+def test_single_result_is_not_promoted():
+    """The only hit of an index keeps its fused score instead of scoring as a perfect match."""
+    index_a = fuse_legs([[result("A", "a1")], [result("A", "a1")]], top_k=2)
+    index_b = fuse_legs([[result("B", "b1")]], top_k=2)
+
+    merged = merge_results([index_b, index_a], top_k=2, method="score")
+    assert [doc["id"] for doc in merged] == ["a1", "b1"], [doc["id"] for doc in merged]
+    assert merged[1]["merged_score"] == 1.0 / (RRF_K + 1)
+
+
+if __name__ == "__main__":
+    test_multi_index_merge()
+    test_single_result_is_not_promoted()
+    print("Ranking tests passed")